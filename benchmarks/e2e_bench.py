@@ -0,0 +1,179 @@
+# end to end benchmark of the scan engine, server info and crawler
+# against the mock target farm of farm.py
+#
+# prints one JSON document (also written to --output) to compare runs:
+#   urls_per_second, arrival p50/p99 (seconds from the start of the phase
+#   until a result arrives), verdict p50/p99 of the scan (seconds from the
+#   dispatch of a url to its verdict), requests and bytes the farm served,
+#   verdicts that disagree with the farm, peak RSS in KiB
+#
+# usage: python benchmarks/e2e_bench.py [--hosts 8] [--urls 400] [--latency 0.02]
+#                                       [--size 20000] [--error-rate 0.0] [--async]
+#                                       [--output e2e.json]
+
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src import scanner
+from src import asyncscanner
+from src import scheduler
+from src import serverinfo
+from farm import Farm
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def quietly():
+    """silence the per url chatter, worker processes inherit it"""
+
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+
+@contextlib.contextmanager
+def dispatches():
+    """record in a dict the time each url is given to a scan worker"""
+
+    times = {}
+    original = scheduler.HostScheduler.next
+
+    def next(self):
+        url = original(self)
+        if url is not None:
+            times.setdefault(url, time.monotonic())
+        return url
+
+    scheduler.HostScheduler.next = next
+    try:
+        yield times
+    finally:
+        scheduler.HostScheduler.next = original
+
+
+def timed(results):
+    """return the items of results and the seconds each one took to arrive"""
+
+    items, arrivals = [], []
+    started = time.monotonic()
+    for item in results:
+        items.append(item)
+        arrivals.append(time.monotonic() - started)
+    return items, arrivals, time.monotonic() - started
+
+
+def report(count, arrivals, elapsed, stats):
+    return {
+        "urls": count,
+        "seconds": round(elapsed, 3),
+        "urls_per_second": round(count / elapsed, 1) if elapsed else None,
+        "arrival_p50": round(percentile(arrivals, 0.50), 3) if arrivals else None,
+        "arrival_p99": round(percentile(arrivals, 0.99), 3) if arrivals else None,
+        "requests": stats["requests"],
+        "bytes": stats["bytes"],
+        "http_errors": stats["errors"],
+    }
+
+
+def scanphase(farm, targets, useasync):
+    farm.stats(reset=True)
+    verdicts = {}  # url -> time its verdict arrived
+
+    def stamped(results):
+        for url, result in results:
+            verdicts[url] = time.monotonic()
+            yield url, result
+
+    with quietly(), dispatches() as dispatched:
+        engine = asyncscanner.iterscan if useasync else scanner.iterscan
+        results, arrivals, elapsed = timed(stamped(engine(list(targets))))
+
+    phase = report(len(targets), arrivals, elapsed, farm.stats())
+    latencies = [verdicts[url] - dispatched[url] for url in verdicts]
+    phase["verdict_p50"] = round(percentile(latencies, 0.50), 3) if latencies else None
+    phase["verdict_p99"] = round(percentile(latencies, 0.99), 3) if latencies else None
+    found = {url: result[1] for url, result in results if result[0]}
+    phase["vulnerable"] = len(found)
+    phase["databases"] = len(set(found.values()))
+    phase["missed"] = sorted(url for url, db in targets.items() if db and found.get(url) != db)
+    phase["false_positives"] = sorted(url for url in found if not targets[url])
+    return phase, found
+
+
+def serverinfophase(farm, urls):
+    # one host stands in for the remote lookup service
+    serverinfo.LOOKUP = farm.root(0) + "/webserver/"
+    serverinfo.known.clear()
+
+    farm.stats(reset=True)
+    with quietly():
+        results, arrivals, elapsed = timed(serverinfo.itercheck(urls))
+
+    phase = report(len(urls), arrivals, elapsed, farm.stats())
+    phase["unknown"] = sum(1 for url, info in results if not info[0])
+    return phase
+
+
+def crawlphase(farm):
+    try:
+        from src import crawler
+    except ImportError as error:
+        return {"skipped": str(error)}
+
+    farm.stats(reset=True)
+    roots = [farm.root(index) for index in range(farm.hosts)]
+    with quietly():
+        results, arrivals, elapsed = timed(crawler.crawlmany(roots, pershape=0))
+
+    phase = report(len(roots), arrivals, elapsed, farm.stats())
+    phase["links"] = sum(len(links) for _, links in results)
+    return phase
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End to end benchmark against a local mock target farm")
+    parser.add_argument("--hosts", type=int, default=8, help="virtual hosts of the farm")
+    parser.add_argument("--urls", type=int, default=400, help="urls scanned")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds before each reply")
+    parser.add_argument("--size", type=int, default=20000, help="bytes of each page")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--vulnerable", type=int, default=10, help="every n-th item is injectable")
+    parser.add_argument("--async", dest="useasync", action="store_true", help="scan with the asyncio engine")
+    parser.add_argument("--output", type=str, help="also write the JSON result to this file")
+    args = parser.parse_args()
+
+    with Farm(args.hosts, latency=args.latency, size=args.size, errorrate=args.error_rate,
+              vulnerable=args.vulnerable) as farm:
+        targets = farm.targets(args.urls)
+
+        scan, found = scanphase(farm, targets, args.useasync)
+        result = {
+            "settings": vars(args),
+            "scan": scan,
+            "serverinfo": serverinfophase(farm, sorted(found) or list(targets)[:args.hosts]),
+            "crawl": crawlphase(farm),
+            # ru_maxrss is in KiB on Linux, children are the worker pools
+            "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "peak_rss_children_kib": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        }
+
+    output = json.dumps(result, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as saved:
+            saved.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
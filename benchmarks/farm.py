@@ -0,0 +1,283 @@
+# mock target farm for the end to end benchmark, virtual hosts on 127.0.0.x
+# answering like small dynamic sites, some of them injectable
+#
+# each host runs in its own process and answers:
+#   /                  index linking item and listing pages, for the crawler
+#   /item.php?id=N     item page, an SQL error when N is a multiple of
+#                      --vulnerable and the query holds a quote; injectable
+#                      items cycle through every signature of sqlerrors,
+#                      so all DBMS are served at the default size
+#   /list.php?cat=N    listing page
+#   /webserver/NAME    server info page shaped like aruljohn.com
+#   /__stats           JSON request counters, ?reset=1 zeroes them
+#
+# usage: python benchmarks/farm.py [--hosts 8] [--latency 0.02] [--size 20000] [--error-rate 0.0]
+# (binding 127.0.0.2 and up works out of the box on Linux only)
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import multiprocessing
+import urllib.request
+from urllib.parse import unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src import sqlerrors
+
+DEFAULT_PORT = 8800
+QUOTES = ("'", '"', "`", "\\")
+
+# an error message per signature of sqlerrors.sql_errors, in its order
+MESSAGES = {
+    "MySQL": ("You have an error in your SQL syntax; check the manual that corresponds to your MySQL server version",
+              "Warning: mysql_fetch_array() expects parameter 1 to be resource, boolean given",
+              "MySQL Query fail: SELECT * FROM items WHERE id=1'",
+              "You have an error in your SQL syntax; check the manual that corresponds to your MariaDB server version"),
+    "PostgreSQL": ("PostgreSQL query failed: ERROR:  unterminated quoted string at or near",
+                   "Warning: pg_query(): Query failed: ERROR:  syntax error at or near",
+                   "Warning: Unknown error in PostgreSQL driver"),
+    "Microsoft SQL Server": ("OLE DB provider for SQL Server returned message: Incorrect syntax",
+                             "[Microsoft][SQL Server Native Client 11.0] ODBC Driver error",
+                             "Warning: odbc_exec(): SQL error: [unixODBC]",
+                             "Warning: mssql_query(): message: Incorrect syntax near",
+                             "Msg 105, Level 15, State 1, Line 1",
+                             "Unclosed quotation mark after the character string ''.",
+                             "Microsoft OLE DB Provider for ODBC Drivers error '80040e14'"),
+    "Microsoft Access": ("[Microsoft][ODBC Microsoft Access Driver] Syntax error",
+                         "Access Database Engine error: syntax error in string",
+                         "Microsoft JET Database Engine error '80040e14'",
+                         "Syntax error in string in query expression 'id = 1''."),
+    "Oracle": ("ORA-01756: quoted string not properly terminated",
+               "Oracle error while executing statement",
+               "Warning: oci_parse(): ORA-00933",
+               "Microsoft OLE DB Provider for Oracle error '80004005'"),
+    "IBM DB2": ("[IBM][CLI Driver][DB2/LINUXX8664] SQL0104N",
+                "DB2 SQL error: SQLCODE=-104, SQLSTATE=42601"),
+    "SQLite": ("SQLite/JDBCDriver: SQLITE_ERROR near \"'\"",
+               "System.Data.SQLite.SQLiteException: SQLite error"),
+    "Informix": ("Warning: ibase_query(): Dynamic SQL Error",
+                 "com.informix.jdbc.IfxSqliConnect: syntax error"),
+    "Sybase": ("Warning: sybase_query(): message: Incorrect syntax",
+               "Sybase message: Incorrect syntax near"),
+}
+
+# (db, pattern, message) of every signature
+SIGNATURES = [(db, pattern, message) for db, patterns in sqlerrors.sql_errors.items()
+              for pattern, message in zip(patterns, MESSAGES[db])]
+
+
+def address(index):
+    """return the loopback address of the host at index"""
+
+    return "127.0.{}.{}".format((index + 2) // 256, (index + 2) % 256)
+
+
+def signature(index, item, hosts, vulnerable):
+    """return the (db, pattern, message) served by injectable item of the host at index
+
+    injectable items are numbered across hosts in the order of Farm.targets
+    """
+
+    return SIGNATURES[((item // vulnerable) * hosts + index) % len(SIGNATURES)]
+
+
+class Host(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written apart, Nagle would delay kept-alive replies
+    disable_nagle_algorithm = True
+
+    # set per process by serve()
+    index = 0
+    hosts = 1
+    latency = 0.0
+    size = 0
+    errorrate = 0.0
+    vulnerable = 10
+    pages = 100
+    stats = None
+    lock = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+
+        if path == "/__stats":
+            with self.lock:
+                body = json.dumps(self.stats).encode()
+                if query == "reset=1":
+                    self.reset()
+            return self.reply(200, body, "application/json")
+
+        time.sleep(self.latency)
+
+        if random.random() < self.errorrate:
+            return self.reply(503, b"<html>Service Unavailable</html>")
+
+        if path == "/":
+            links = ['<a href="/item.php?id={}">item {}</a>'.format(number, number) for number in range(self.pages)]
+            links += ['<a href="/list.php?cat={}">category {}</a>'.format(number, number) for number in range(10)]
+            return self.reply(200, self.page("<br>".join(links)))
+
+        if path == "/item.php":
+            value = unquote(query.partition("id=")[2])
+            number = re.match(r"\d*", value).group()
+            if number and int(number) % self.vulnerable == 0 and any(quote in value for quote in QUOTES):
+                message = signature(self.index, int(number), self.hosts, self.vulnerable)[2]
+                return self.reply(500, self.page("<b>{}</b>".format(message)))
+            return self.reply(200, self.page("<h1>item {}</h1>".format(value)))
+
+        if path == "/list.php":
+            return self.reply(200, self.page("<h1>listing {}</h1>".format(unquote(query))))
+
+        if path.startswith("/webserver/"):
+            rows = '<tr><td class="title">Web server</td><td>{}</td></tr>' \
+                   '<tr><td class="title">Powered by</td><td>{}</td></tr>'.format(*self.software())
+            return self.reply(200, "<html><body><table>{}</table></body></html>".format(rows).encode())
+
+        return self.reply(404, b"<html>Not Found</html>")
+
+    def software(self):
+        return "Apache/2.4.{}".format(self.index), "PHP/7.{}".format(self.index % 5)
+
+    def page(self, content):
+        """return an HTML page of about size bytes around content"""
+
+        filler = "<p>" + "lorem ipsum dolor sit amet " * 3 + "</p>\n"
+        count = max(0, (self.size - len(content)) // len(filler))
+        return "<html><body>{}\n{}</body></html>".format(content, filler * count).encode()
+
+    def reply(self, status, body, contenttype="text/html"):
+        server, lang = self.software()
+        self.send_response(status)
+        self.send_header("Content-Type", contenttype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Server", server)
+        self.send_header("X-Powered-By", lang)
+        self.end_headers()
+        self.wfile.write(body)
+
+        if not self.path.startswith("/__stats"):
+            with self.lock:
+                self.stats["requests"] += 1
+                self.stats["bytes"] += len(body)
+                if status >= 400:
+                    self.stats["errors"] += 1
+
+    @classmethod
+    def reset(cls):
+        cls.stats.update(requests=0, bytes=0, errors=0)
+
+
+def serve(index, hosts, port, latency, size, errorrate, vulnerable, pages, ready):
+    Host.index = index
+    Host.hosts = hosts
+    Host.latency = latency
+    Host.size = size
+    Host.errorrate = errorrate
+    Host.vulnerable = vulnerable
+    Host.pages = pages
+    Host.stats = {}
+    Host.lock = threading.Lock()
+    Host.reset()
+
+    random.seed(index)
+    server = ThreadingHTTPServer((address(index), port), Host)
+    server.daemon_threads = True
+    ready.set()
+    server.serve_forever()
+
+
+class Farm:
+    """the mock hosts, each serving from its own process"""
+
+    def __init__(self, hosts=8, port=DEFAULT_PORT, latency=0.02, size=20000, errorrate=0.0, vulnerable=10, pages=100):
+        self.hosts = hosts
+        self.port = port
+        self.settings = (latency, size, errorrate, vulnerable, pages)
+        self.vulnerable = vulnerable
+        self.processes = []
+
+        # messages must still be recognized, or the farm tests nothing
+        for db, pattern, message in SIGNATURES:
+            assert re.search(pattern, message) and sqlerrors.check(message) == (True, db), pattern
+
+    def start(self):
+        for index in range(self.hosts):
+            ready = multiprocessing.Event()
+            process = multiprocessing.Process(target=serve, args=(index, self.hosts, self.port) + self.settings + (ready,), daemon=True)
+            process.start()
+            ready.wait(10)
+            self.processes.append(process)
+        return self
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+            process.join()
+        self.processes = []
+
+    def root(self, index):
+        return "http://{}:{}".format(address(index), self.port)
+
+    def targets(self, count):
+        """return {url: db} of count item urls spread over the hosts, db is None if not injectable"""
+
+        targets = {}
+        for number in range(count):
+            index, item = number % self.hosts, number // self.hosts
+            url = "{}/item.php?id={}".format(self.root(index), item)
+            injectable = item % self.vulnerable == 0
+            targets[url] = signature(index, item, self.hosts, self.vulnerable)[0] if injectable else None
+        return targets
+
+    def stats(self, reset=False):
+        """return the request counters summed over all hosts"""
+
+        total = {"requests": 0, "bytes": 0, "errors": 0}
+        for index in range(self.hosts):
+            url = self.root(index) + "/__stats" + ("?reset=1" if reset else "")
+            with urllib.request.urlopen(url, timeout=10) as reply:
+                for name, value in json.loads(reply.read()).items():
+                    total[name] += value
+        return total
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock target farm for the end to end benchmark")
+    parser.add_argument("--hosts", type=int, default=8)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds before each reply")
+    parser.add_argument("--size", type=int, default=20000, help="bytes of each page")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--vulnerable", type=int, default=10, help="every n-th item is injectable")
+    args = parser.parse_args()
+
+    farm = Farm(args.hosts, args.port, args.latency, args.size, args.error_rate, args.vulnerable).start()
+    for index in range(args.hosts):
+        print("{}/".format(farm.root(index)))
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        farm.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# micro benchmark of sqlerrors.check against the former per-call regex loop
+#
+# usage: python benchmarks/sqlerrors_bench.py [saved_page.html ...]
+
+import os
+import re
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src import sqlerrors
+
+
+# error messages as DBMS print them, one per signature family
+samples = {
+    "MySQL": "You have an error in your SQL syntax; check the manual that corresponds to your MySQL server version",
+    "PostgreSQL": "Warning: pg_query(): Query failed: ERROR:  syntax error at or near",
+    "Microsoft SQL Server": "Unclosed quotation mark after the character string ''.",
+    "Microsoft Access": "Microsoft JET Database Engine error '80040e14'",
+    "Oracle": "ORA-01756: quoted string not properly terminated",
+    "IBM DB2": "DB2 SQL error: SQLCODE=-104, SQLSTATE=42601",
+    "SQLite": "System.Data.SQLite.SQLiteException: SQLite error",
+    "Informix": "Warning: ibase_query(): Dynamic SQL Error",
+    "Sybase": "Sybase message: Incorrect syntax near",
+}
+
+
+# messages broken over two lines, \W of the pattern matching the newline
+wrapped = {
+    "PostgreSQL": "<b>Warning</b>:\npg_query(): Query failed",
+    "Microsoft SQL Server": "[Microsoft]\nSQL Server Native Client 11.0 ODBC Driver",
+}
+
+
+def legacy(html):
+    """sqlerrors.check before signatures were compiled at import"""
+
+    for db, errors in sqlerrors.sql_errors.items():
+        for error in errors:
+            if re.compile(error).search(html):
+                return True, db
+    return False, None
+
+
+def page(size=60000, seed=1):
+    """return a product listing page of about the given size"""
+
+    random.seed(seed)
+    words = ("product", "price", "cart", "search", "shipping", "review", "stock", "brand",
+             "category", "new", "sale", "account", "login", "contact", "color", "size")
+
+    lines = ["<!DOCTYPE html>", "<html><head><title>Shop</title>",
+             "<script>var cfg = {\"page\": 1, \"items\": 24};</script></head><body>"]
+    while sum(len(line) for line in lines) < size:
+        text = " ".join(random.choice(words) for _ in range(random.randint(8, 40)))
+        lines.append('<div class="item"><a href="/item.php?id={}">{}</a><p>{}</p></div>'.format(
+            random.randint(1, 9999), text[:30], text))
+    # PHP notices and vendor names give the prefilter some candidate lines
+    lines.insert(len(lines) // 2, "<b>Warning</b>: Undefined index: sort in /var/www/list.php on line 12")
+    lines.insert(len(lines) // 3, "<p>Runs on Oracle Linux and Microsoft SQL Server</p>")
+    lines.append("</body></html>")
+    return "\n".join(lines)
+
+
+def main():
+    pages = [open(path, encoding="utf-8", errors="ignore").read() for path in sys.argv[1:]]
+    if not pages:
+        pages = [page()]
+
+    # both implementations must agree on clean and erroneous bodies
+    for html in pages:
+        assert sqlerrors.check(html) == legacy(html)
+        for db, sample in samples.items():
+            body = html.replace("</body>", "<b>{}</b></body>".format(sample))
+            assert sqlerrors.check(body) == legacy(body) == (True, db), db
+        for db, sample in wrapped.items():
+            body = html.replace("</body>", "<b>{}</b></body>".format(sample))
+            assert sqlerrors.check(body) == legacy(body) == (True, db), db
+            # split inside the message, the matcher must join the chunks
+            matcher = sqlerrors.Matcher()
+            split = body.index(sample) + sample.index("\n") + 2
+            assert matcher.feed(body[:split].encode()) or matcher.feed(body[split:].encode()), db
+            assert matcher.db == db, db
+
+    for html in pages:
+        number = 200
+        before = timeit.timeit(lambda: legacy(html), number=number) / number
+        after = timeit.timeit(lambda: sqlerrors.check(html), number=number) / number
+        print("{:>8} bytes  legacy {:8.3f} ms  check {:8.3f} ms  speedup {:5.1f}x".format(
+            len(html), before * 1000, after * 1000, before / after))
+
+
+if __name__ == "__main__":
+    main()
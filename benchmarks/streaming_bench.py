@@ -0,0 +1,102 @@
+# time to the first verdict while the url producer is still running
+#
+# feeds both scan engines the way SQLiv.iterscan does, through a pipeline
+# stage, from a producer yielding one injectable url and stalling;
+# the verdict must come out long before the producer ends, and when the
+# producer fails instead like a search does, the verdict must still come
+# out before its error is raised in the consumer's thread
+#
+# usage: python benchmarks/streaming_bench.py [--stall 4]
+
+import os
+import sys
+import time
+import argparse
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src import pipeline
+from src import scanner
+from src import asyncscanner
+from sqlerrors_bench import samples
+
+
+class Target(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        error = "'" in self.path or "%27" in self.path
+        body = "<html><body>{}</body></html>".format(samples["MySQL"] if error else "item").encode()
+        self.send_response(500 if error else 200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def firstverdict(engine, url, stall):
+    """return the seconds until the first verdict and until the scan ends"""
+
+    def produce():
+        yield url
+        time.sleep(stall)
+
+    started = time.monotonic()
+    first = None
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for _, result in engine(pipeline.stage(produce())):
+            assert result[0], "injectable url not found"
+            first = time.monotonic() - started
+    return first, time.monotonic() - started
+
+
+def failing(engine, url):
+    """return the verdicts yielded before the error of a failing producer, and the error"""
+
+    def produce():
+        yield url
+        sys.exit("search failed")
+
+    verdicts = []
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        try:
+            for _, result in engine(pipeline.stage(produce())):
+                verdicts.append(result)
+        except SystemExit as error:
+            return verdicts, error
+    return verdicts, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to the first verdict with a stalling url producer")
+    parser.add_argument("--stall", type=float, default=4.0, help="seconds the producer stalls after its url")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Target)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/item.php?id=1".format(server.server_address[1])
+
+    for name, engine in (("process", scanner.iterscan), ("async", asyncscanner.iterscan)):
+        first, total = firstverdict(engine, url, args.stall)
+        print("{:>8}  first verdict {:6.3f} s  scan ended {:6.3f} s".format(name, first, total))
+        # a verdict held back until the producer ends means the input is read blocking
+        assert first < args.stall / 2, name
+
+        verdicts, error = failing(engine, url)
+        print("{:>8}  failing producer: {} verdict, raised {!r}".format(name, len(verdicts), error))
+        assert error is not None and len(verdicts) == 1 and verdicts[0][0], name
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
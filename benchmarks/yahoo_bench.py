@@ -0,0 +1,68 @@
+# parse time of yahoo result pages, lxml XPath against the former BeautifulSoup walk
+#
+# usage: python benchmarks/yahoo_bench.py [saved_result_page.html ...]
+
+import os
+import sys
+import timeit
+
+import bs4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lib import yahoo
+
+
+def legacy(html):
+    """Yahoo.parse_links before the lxml rewrite
+
+    the leading space of its class filter is dropped here, bs4 compares
+    against the normalized class list so the original never matched
+    """
+
+    links = []
+
+    soup = bs4.BeautifulSoup(html, "lxml")
+    for span in soup.findAll('div'):
+        links += [a['href'] for a in span.findAll('a', {"class": "ac-algo fz-l ac-21th lh-24"}, href=True)\
+                  if a['href'] not in links]
+
+    return links
+
+
+def page(results=10, depth=6, filler=400):
+    """return a result page shaped like yahoo's: deeply nested divs around the results"""
+
+    parts = ["<html><head><title>inurl:index.php?id= - Yahoo Search Results</title></head><body>"]
+    for index in range(filler):
+        parts.append('<div class="sys"><div><span><a href="/nav/{0}">nav {0}</a></span></div></div>'.format(index))
+
+    for index in range(results):
+        parts.append("<div class=\"dd algo\">" * depth)
+        parts.append('<h3 class="title"><a class=" ac-algo fz-l ac-21th lh-24" '
+                     'href="http://site{0}.example.com/index.php?id={0}">Result {0}</a></h3>'.format(index))
+        parts.append("<p>snippet text for result {} with a few words in it</p>".format(index))
+        parts.append("</div>" * depth)
+
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def main():
+    pages = [open(path, "rb").read() for path in sys.argv[1:]]
+    if not pages:
+        pages = [page()]
+
+    parser = yahoo.Yahoo()
+    for html in pages:
+        assert parser.parse_links(html) == list(dict.fromkeys(legacy(html)))
+
+        number = 50
+        before = timeit.timeit(lambda: legacy(html), number=number) / number
+        after = timeit.timeit(lambda: parser.parse_links(html), number=number) / number
+        print("{:>8} bytes  bs4 {:8.3f} ms  lxml {:8.3f} ms  speedup {:5.1f}x".format(
+            len(html), before * 1000, after * 1000, before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,13 +13,19 @@ __name__    = 'python-bing'
 __version__ = "0.0.1"
 
 import re
+import threading
+import http.client
+import urllib.error
 import urllib.parse
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 class Bing:
-    def __init__(self):
-        self.bingsearch = "http://www.bing.com/search?%s"
+    def __init__(self, workers=3):
+        self.bingsearch = "https://www.bing.com/search?%s"
         self.regex = re.compile('<h2><a href="(.*?)"')
+        self.workers = workers  # result pages fetched at once
+        self.local = threading.local()  # keep-alive connections of each thread
+        self.cache = None  # result pages cache with a cached(engine, query, offset, fetch) method
 
     def default_headers(self, name = __name__):
         '''
@@ -31,11 +37,32 @@ class Bing:
 
         return {
             'Accept'         : 'text/html',
-            'Connection'     : 'close',
+            'Connection'     : 'keep-alive',
             'User-Agent'     : '%s/%s' % (name, __version__),
             'Accept-Encoding': 'identity'
             }
 
+    def connection(self, scheme, netloc):
+        '''
+        :type scheme : str
+        :param scheme: http or https
+
+        :type netloc : str
+        :param netloc: Host to connect to
+
+        :rtype: http.client.HTTPConnection
+        :return: Connection of the current thread, reused between pages
+        '''
+
+        connections = self.local.__dict__.setdefault('connections', {})
+        if (scheme, netloc) not in connections:
+            if scheme == 'https':
+                connections[(scheme, netloc)] = http.client.HTTPSConnection(netloc, timeout=10)
+            else:
+                connections[(scheme, netloc)] = http.client.HTTPConnection(netloc, timeout=10)
+
+        return connections[(scheme, netloc)]
+
     def get_page(self, URL):
         '''
         :type URL : str
@@ -44,10 +71,43 @@ class Bing:
         :rtpye: str
         '''
 
-        request = urllib.request.Request(URL, headers=self.default_headers())
-        resp    = urllib.request.urlopen(request)
+        parsed     = urllib.parse.urlsplit(URL)
+        connection = self.connection(parsed.scheme, parsed.netloc)
+
+        # a kept alive connection may have been closed by the server, retry once
+        for attempt in range(2):
+            try:
+                connection.request('GET', parsed.path + '?' + parsed.query, headers=self.default_headers())
+                resp = connection.getresponse()
+                html = resp.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                if attempt:
+                    raise urllib.error.URLError(e)
+
+        if resp.status != 200:
+            raise urllib.error.HTTPError(URL, resp.status, resp.reason, resp.headers, None)
+
+        return html
+
+    def fetch_page(self, query, start):
+        '''
+        :type query : str
+        :param query: Query for search
+
+        :type start : int
+        :param start: Index of the first result of the page
+
+        :rtype: bytes
+        :return: Result page, from the cache if one is set
+        '''
+
+        URL = (self.bingsearch % (urllib.parse.urlencode({'q': query}))) + '&first=' + str(start)
+        if self.cache is None:
+            return self.get_page(URL)
 
-        return resp.read()
+        return self.cache.cached('bing', query, start, lambda: self.get_page(URL))
 
     def parse_links(self, html):
         '''
@@ -69,18 +129,47 @@ class Bing:
 
         :rtype: list
         '''
- 
-        links = []
-        start = 1
 
-        for page in range(int(round(int(stop), -1)) / 10):
-            URL = (self.bingsearch % (urllib.parse.urlencode({'q': query}))) + '&first=' + str(start)
+        return list(self.results(query, stop))
 
-            html   = self.get_page(URL)
-            result = self.parse_links(html)
+    def results(self, query, stop=100):
+        '''
+        :type query : str
+        :param query: Query for search
 
-            [links.append(_) for _ in result if _ not in links]
+        :type stop  : int
+        :param stop : Last result to retrieve.
 
-            start = start + 10
+        :rtype: generator
+        :return: links, as soon as their result page is parsed
+        '''
 
-        return links
+        # ten results per page, rounded up so a partial page is fetched too
+        pages = list(range(1, (int(stop) + 9) // 10 * 10 + 1, 10))
+
+        # insertion ordered set of the links found
+        links = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # up to workers pages are fetched ahead, results are merged in page order
+            futures = [executor.submit(self.fetch_page, query, start) for start in pages[:self.workers]]
+            pages = pages[self.workers:]
+
+            try:
+                while futures:
+                    html = futures.pop(0).result().decode('utf-8', 'ignore')
+                    if pages:
+                        futures.append(executor.submit(self.fetch_page, query, pages.pop(0)))
+
+                    found = len(links)
+                    for link in self.parse_links(html):
+                        if link not in links:
+                            links[link] = None
+                            yield link
+
+                    # past the last page bing repeats its results
+                    if len(links) == found:
+                        break
+            finally:
+                for future in futures:
+                    future.cancel()
@@ -33,6 +33,9 @@ __all__ = ['search', 'search_images', 'search_news', 'search_videos', 'search_sh
 import os
 import sys
 import time
+import atexit
+import tempfile
+import threading
 
 from http.cookiejar import LWPCookieJar
 from urllib.request import Request, urlopen
@@ -64,6 +67,63 @@ try:
 except Exception:
     pass
 
+# The jar is kept in memory and written at most every cookie_flush_interval
+# seconds and at exit, instead of after every page.
+cookie_lock = threading.RLock()
+cookie_flush_interval = 60.0
+cookie_dirty = False
+cookie_saved = time.time()
+
+# Result pages cache with a cached(engine, query, offset, fetch) method,
+# None to always request Google.
+page_cache = None
+
+
+# Write the cookie jar to disk if it changed since the last write.
+def save_cookies():
+    """
+    Write the cookie jar to disk, merged with the cookies other processes
+    saved meanwhile, replacing the file atomically so that concurrent
+    readers never see a partly written file.
+    """
+    global cookie_dirty, cookie_saved
+
+    with cookie_lock:
+        if not cookie_dirty:
+            return
+
+        # Cookies of this process win over the ones found on disk.
+        merged = LWPCookieJar()
+        try:
+            merged.load(cookie_jar.filename)
+        except Exception:
+            pass
+        for cookie in cookie_jar:
+            merged.set_cookie(cookie)
+
+        # Written aside then renamed. This module does not depend on the
+        # rest of sqliv, so it keeps its own copy of std.atomicwrite.
+        folder = os.path.dirname(cookie_jar.filename) or '.'
+        try:
+            handle, temp = tempfile.mkstemp(prefix='.google-cookie.', dir=folder)
+            os.close(handle)
+        except Exception:
+            return
+        try:
+            merged.save(temp)
+            os.replace(temp, cookie_jar.filename)
+        except Exception:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            return
+
+        cookie_dirty = False
+        cookie_saved = time.time()
+
+atexit.register(save_cookies)
+
 
 # Request the given URL and return the response page, using the cookie jar.
 def get_page(url):
@@ -80,15 +140,21 @@ def get_page(url):
     @raise urllib2.URLError: An exception is raised on error.
     @raise urllib2.HTTPError: An exception is raised on error.
     """
+    global cookie_dirty
+
     request = Request(url)
     request.add_header('User-Agent',
                        'Mozilla/4.0 (compatible; MSIE 8.0; Windows NT 6.0)')
-    cookie_jar.add_cookie_header(request)
+    with cookie_lock:
+        cookie_jar.add_cookie_header(request)
     response = urlopen(request)
-    cookie_jar.extract_cookies(response, request)
+    with cookie_lock:
+        cookie_jar.extract_cookies(response, request)
+        cookie_dirty = True
     html = response.read()
     response.close()
-    cookie_jar.save()
+    if time.time() - cookie_saved >= cookie_flush_interval:
+        save_cookies()
     return html
 
 
@@ -234,8 +300,18 @@ def search(query, tld='com', lang='en', tbs='0', safe='off', num=10, start=0,
                 builtin_param
             )
 
-    # Grab the cookie from the home page.
-    get_page(url_home % vars())
+    # The cookie from the home page is only needed once a page is requested.
+    home = [url_home % vars()]
+
+    def fetch(url):
+        if home:
+            get_page(home.pop())
+
+        # Sleep between requests.
+        time.sleep(pause)
+
+        # Request the Google Search results page.
+        return get_page(url)
 
     # Prepare the URL of the first request.
     if start:
@@ -260,11 +336,11 @@ def search(query, tld='com', lang='en', tbs='0', safe='off', num=10, start=0,
         for k, v in iter_extra_params:
             url += url + ('&%s=%s' % (k, v))
 
-        # Sleep between requests.
-        time.sleep(pause)
-
-        # Request the Google Search results page.
-        html = get_page(url)
+        # Request the Google Search results page, unless it is cached.
+        if page_cache is None:
+            html = fetch(url)
+        else:
+            html = page_cache.cached('google', '%s:%d' % (query, num), start, lambda: fetch(url))
 
         # Parse the response and process every anchored URL.
         if is_bs4:
@@ -3,18 +3,27 @@
 
 import urllib.request
 import urllib.parse
-import bs4
+from concurrent.futures import ThreadPoolExecutor
+
+import lxml.etree
+import lxml.html
 
 
 DEFAULT_CONTENTYPE = "application/x-www-form-urlencoded; charset=UTF-8"
 DEFAULT_USERAGENT = "yahoo search"
 
+# result links, compiled once instead of walking every div of the page
+RESULT_LINKS = lxml.etree.XPath(
+    "//a[contains(concat(' ', normalize-space(@class), ' '), ' ac-algo ')]/@href")
+
 
 class Yahoo:
     """yahoo search engine scraper"""
 
-    def __init__(self):
+    def __init__(self, workers=3):
         self.yahoosearch = "https://search.yahoo.com/search;?p=%s&n=%s&b=%s"
+        self.workers = workers  # result pages fetched at once
+        self.cache = None  # result pages cache with a cached(engine, query, offset, fetch) method
         self.init_header()
 
     def init_header(self, contenttype=DEFAULT_CONTENTYPE, useragent=DEFAULT_USERAGENT):
@@ -26,30 +35,67 @@ class Yahoo:
     def search(self, query, per_page=10, pages=1):
         """search urls from yahoo search"""
 
-        # store searched urls
-        urls = []
+        return list(self.results(query, per_page, pages))
+
+    def results(self, query, per_page=10, pages=1):
+        """yield urls from yahoo search as soon as each page is parsed"""
+
+        # b is the 1-based index of the first result of the page
+        offsets = [page * per_page + 1 for page in range(pages)]
+
+        # insertion ordered set of the urls found
+        urls = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # up to workers pages are fetched ahead, results are merged in page order
+            futures = [executor.submit(self.fetch_page, query, per_page, offset) for offset in offsets[:self.workers]]
+            offsets = offsets[self.workers:]
+
+            try:
+                while futures:
+                    result = futures.pop(0).result()
+                    if offsets:
+                        futures.append(executor.submit(self.fetch_page, query, per_page, offsets.pop(0)))
 
-        for page in range(pages):
-            yahoosearch = self.yahoosearch % (query, per_page, (pages+1)*10)
+                    found = len(urls)
+                    for url in self.parse_links(result):
+                        if url not in urls:
+                            urls[url] = None
+                            yield url
 
-            request = urllib.request.Request(yahoosearch)
-            request.add_header("Content-type", self.contenttype)
-            request.add_header("User-Agent", self.useragent)
+                    # no new result, the last page was passed
+                    if len(urls) == found:
+                        break
+            finally:
+                for future in futures:
+                    future.cancel()
 
-            result = urllib.request.urlopen(request).read()
-            urls += self.parse_links(result)
+    def fetch_page(self, query, per_page, offset):
+        """return html of a result page, from the cache if one is set"""
 
-        return urls
+        if self.cache is None:
+            return self.get_page(query, per_page, offset)
+
+        return self.cache.cached("yahoo", query, offset, lambda: self.get_page(query, per_page, offset))
+
+    def get_page(self, query, per_page, offset):
+        """return html of a result page"""
+
+        yahoosearch = self.yahoosearch % (urllib.parse.quote_plus(query), per_page, offset)
+
+        request = urllib.request.Request(yahoosearch)
+        request.add_header("Content-type", self.contenttype)
+        request.add_header("User-Agent", self.useragent)
+
+        return urllib.request.urlopen(request).read()
 
     def parse_links(self, html):
         """scrape results (url) from html"""
 
-        # init with empty list
-        links = []
-
-        soup = bs4.BeautifulSoup(html, "lxml")
-        for span in soup.findAll('div'):
-            links += [a['href'] for a in span.findAll('a', {"class": " ac-algo fz-l ac-21th lh-24"}, href=True)\
-                      if a['href'] not in links]
+        try:
+            tree = lxml.html.fromstring(html)
+        except (lxml.etree.ParserError, ValueError):
+            return []
 
-        return links
+        # insertion ordered and duplicate free
+        return list(dict.fromkeys(str(href) for href in RESULT_LINKS(tree)))
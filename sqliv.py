@@ -2,18 +2,68 @@
 # Ghost (github.com/Hadesy2k)
 # official.ghost@tuta.io
 
+import atexit
 import argparse
 import sys
+import threading
+from functools import partial
 from urllib.parse import urlparse
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Iterator
 
 from src import std
 from src import scanner
+from src import asyncscanner
+from src import shape
+from src import journal
+from src import seen
+from src import metrics
+from src import pipeline
 from src import reverseip
 from src import serverinfo
+from src.web import web
 from src.web import search
+from src.web import cache
+from src import crawler
 from src.crawler import Crawler
 
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def duration(value: str) -> float:
+    """
+    Parse a duration such as 90, 30m, 12h or 7d into seconds.
+
+    Args:
+        value: Number with an optional s, m, h, d or w unit
+
+    Returns:
+        float: Duration in seconds
+    """
+    unit = UNITS.get(value[-1:].lower())
+    try:
+        return float(value[:-1]) * unit if unit else float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid duration: {value}")
+
+
+def positive(value: str) -> int:
+    """
+    Parse a count which must be at least 1.
+
+    Args:
+        value: Whole number
+
+    Returns:
+        int: The count
+    """
+    try:
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid count: {value}")
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value}")
+    return count
+
 
 class SQLiv:
     def __init__(self):
@@ -22,6 +72,129 @@ class SQLiv:
         self.google = search.Google()
         self.yahoo = search.Yahoo()
         self.crawler = Crawler()
+        self.engine = scanner.iterscan
+        self.pershape = 1
+        self.collapsedfile = None
+        self.journal = None
+        self.seen = None
+        self.seenwithin = 0
+        self.resume = False
+        self.serverlookup = False
+        self.crawlworkers = crawler.DEFAULT_WORKERS
+        self.crawloptions = {}
+
+    def setup(self, args: argparse.Namespace) -> None:
+        """Select the scan engine from command line options"""
+        self.pershape = args.per_shape
+        self.crawlworkers = args.crawl_workers
+        self.crawloptions = {"pershape": args.per_shape, "depth": args.crawl_depth, "threads": args.crawl_threads,
+                             "maxpages": args.max_pages, "budget": args.crawl_budget}
+        self.crawler = Crawler(**self.crawloptions)
+        self.collapsedfile = args.collapsed
+
+        self.resume = args.resume
+        self.serverlookup = args.server_lookup
+        search.bingsearch.workers = args.search_workers
+        search.yahoosearch.workers = args.search_workers
+        if args.journal or args.resume:
+            self.journal = journal.Journal(args.journal or journal.DEFAULT_JOURNAL)
+            atexit.register(self.journal.close)
+
+        if args.metrics or args.metrics_prom:
+            metrics.start(args.metrics, args.metrics_prom, args.metrics_interval)
+
+        if args.skip_seen_within:
+            self.seen = seen.SeenStore(args.seen)
+            self.seenwithin = args.skip_seen_within
+            atexit.register(self.seen.close)
+
+        if args.reverse:
+            reverseip.load()
+            atexit.register(reverseip.save)
+
+        if args.server_lookup:
+            serverinfo.load()
+            atexit.register(serverinfo.save)
+
+        if args.dork and not args.no_cache:
+            pagecache = cache.PageCache(ttl=args.cache_ttl, refresh=args.refresh)
+            atexit.register(pagecache.close)
+            search.setcache(pagecache)
+
+        if args.asyncio:
+            self.engine = partial(asyncscanner.iterscan, concurrency=args.concurrency, maxbytes=args.max_body,
+                                fanout=args.fanout, perparam=args.per_param, hostlimit=args.host_limit,
+                                baseline=args.baseline)
+        else:
+            self.engine = partial(scanner.iterscan, maxbytes=args.max_body, baseline=args.baseline,
+                                  hostlimit=args.host_limit)
+
+    def scan(self, urls: Iterable[str]) -> List:
+        """Scan URLs for SQL injection and return the vulnerable ones"""
+        return list(self.iterscan(urls))
+
+    def iterscan(self, urls: Iterable[str]) -> Iterator:
+        """
+        Scan URLs for SQL injection, journaling each verdict as it arrives.
+
+        URLs with a journaled verdict are skipped with --resume, URLs
+        scanned by a recent run with --skip-seen-within, and only
+        --per-shape representatives of URLs sharing a shape are scanned.
+        URLs are read in a separate stage, so they may come from a slow
+        generator such as a search engine.
+
+        Yields:
+            (url, db, [server, lang]) of each vulnerable URL as soon as it
+            is found, server and lang are taken from its response headers
+        """
+        if self.resume:
+            urls = self.journal.unscanned(urls)
+
+        if self.seen:
+            urls = self.seen.unseen(urls, self.seenwithin)
+
+        shapes = shape.Shapes(self.pershape)
+        if self.pershape:
+            urls = shapes.filter(urls)
+
+        results = {}
+        try:
+            for url, result in self.engine(pipeline.stage(urls)):
+                results[url] = result
+                if self.journal:
+                    self.journal.record(url, result)
+                if self.seen:
+                    self.seen.record(url, result)
+                if result[0]:
+                    yield url, result[1], result[3]
+        except KeyboardInterrupt:
+            std.stderr("stopping sqli scanning process")
+        finally:
+            if self.journal:
+                self.journal.flush()
+            if self.seen:
+                self.seen.flush()
+
+        scanner.skipreport(results)
+
+        if self.resume and self.journal.resumed:
+            std.stdout(f"Resumed {len(self.journal.resumed)} vulnerable URLs from {self.journal.path}")
+            for url, db in self.journal.resumed:
+                yield url, db, ['', '']
+            self.journal.resumed = []
+
+        if self.seen and self.seen.skipped:
+            std.stdout(f"Skipped {self.seen.skipped} URLs scanned by a recent run")
+            for url, db in self.seen.recalled:
+                yield url, db, ['', '']
+            self.seen.skipped = 0
+            self.seen.recalled = []
+
+        if shapes.collapsed:
+            std.stdout(f"Skipped {len(shapes.collapsed)} URLs sharing the shape of a scanned one")
+            if self.collapsedfile:
+                std.dump(shapes.collapsed, self.collapsedfile)
+                std.stdout(f"Saved skipped URLs as {self.collapsedfile}")
 
     def singlescan(self, url: str) -> Optional[List[Dict[str, Any]]]:
         """
@@ -34,7 +207,7 @@ class SQLiv:
             List of vulnerable URLs and their details if found, None otherwise
         """
         if urlparse(url).query:
-            result = scanner.scan([url])
+            result = self.scan([url])
             if result:
                 return result
             
@@ -43,16 +216,35 @@ class SQLiv:
             if not std.stdin("Do you want to crawl and continue scanning? [Y/N]", ["Y", "N"], upper=True) == 'Y':
                 return None
 
-        # Crawl and scan the links
+        # Crawl and scan the links, each link is scanned as soon as the
+        # crawler finds it
         std.stdout(f"Going to crawl {url}")
-        urls = self.crawler.crawl(url)
+        links = pipeline.Channel()
+
+        def crawl() -> None:
+            try:
+                self.crawler.crawl(url, links.put)
+            except BaseException as error:
+                links.close(error)
+            else:
+                links.close()
+
+        threading.Thread(target=crawl, daemon=True).start()
+
+        urls = []
+
+        def crawled() -> Iterator[str]:
+            for link in links:
+                urls.append(link)
+                yield link
+
+        vulnerables = self.scan(crawled())
 
         if not urls:
             std.stdout("Found no suitable URLs to test SQLi")
             return None
 
         std.stdout(f"Found {len(urls)} URLs from crawling")
-        vulnerables = scanner.scan(urls)
 
         if not vulnerables:
             std.stdout("No SQL injection vulnerability found")
@@ -60,7 +252,7 @@ class SQLiv:
 
         return vulnerables
 
-    def process_dork_scan(self, args: argparse.Namespace) -> None:
+    def process_dork_scan(self, args: argparse.Namespace) -> List:
         """Handle scanning with dork search"""
         std.stdout("Searching for websites with given dork")
 
@@ -74,19 +266,26 @@ class SQLiv:
             std.stderr("Invalid search engine")
             sys.exit(1)
 
-        websites = engines[args.engine].search(args.dork, args.page)
-        std.stdout(f"{len(websites)} websites found")
+        # search, scan and server info run as one pipeline: URLs are
+        # scanned as soon as their result page is parsed, and server info
+        # is fetched as soon as a URL is found vulnerable
+        websites = []
 
-        vulnerables = scanner.scan(websites)
+        def searched():
+            for website in engines[args.engine].iterate(args.dork, args.page):
+                websites.append(website)
+                yield website
 
-        if not vulnerables:
+        table_data = self.process_vulnerables(self.iterscan(searched()))
+        std.stdout(f"{len(websites)} websites found")
+
+        if not table_data:
             if args.save_searches:
                 std.stdout("Saved as searches.txt")
                 std.dump(websites, "searches.txt")
             sys.exit(0)
 
-        std.stdout("Scanning server information")
-        self.process_vulnerables(vulnerables)
+        return table_data
 
     def initparser(self) -> argparse.ArgumentParser:
         """Initialize and return argument parser"""
@@ -98,9 +297,35 @@ class SQLiv:
         parser.add_argument('-r', dest="reverse", help="Reverse domain lookup", action='store_true')
         parser.add_argument('-o', dest="output", help="Output result to JSON file", type=str, metavar="result.json")
         parser.add_argument('-s', dest="save_searches", help="Save search results even if no vulnerabilities found", action='store_true')
+        parser.add_argument('--no-cache', dest="no_cache", help="Always request the search engine instead of reusing cached result pages", action='store_true')
+        parser.add_argument('--refresh', dest="refresh", help="Request the search engine again and update the cached result pages", action='store_true')
+        parser.add_argument('--cache-ttl', dest="cache_ttl", help="Reuse cached result pages for this long", type=duration, default=cache.DEFAULT_TTL, metavar="24h")
+        parser.add_argument('--search-workers', dest="search_workers", help="Search result pages fetched at once", type=int, default=3, metavar="3")
+        parser.add_argument('--async', dest="asyncio", help="Scan with the asyncio engine instead of a process pool", action='store_true')
+        parser.add_argument('--concurrency', dest="concurrency", help="Payload requests in flight with --async", type=positive, default=asyncscanner.DEFAULT_CONCURRENCY, metavar="500")
+        parser.add_argument('--fanout', dest="fanout", help="Send all payloads of a URL at once with --async", action='store_true')
+        parser.add_argument('--per-param', dest="per_param", help="Also inject each query parameter on its own with --async", action='store_true')
+        parser.add_argument('--host-limit', dest="host_limit", help="URLs and payload requests in flight per host", type=positive, default=asyncscanner.DEFAULT_HOSTLIMIT, metavar="8")
+        parser.add_argument('--baseline', dest="baseline", help="Skip a URL when this many payload responses equal its untouched response, 0 disables", type=int, default=scanner.DEFAULT_BASELINE, metavar="2")
+        parser.add_argument('--per-shape', dest="per_shape", help="URLs crawled and scanned per host, path and parameter names, 0 keeps all", type=int, default=1, metavar="1")
+        parser.add_argument('--crawl-workers', dest="crawl_workers", help="Domains crawled at once in reverse domain scans", type=int, default=crawler.DEFAULT_WORKERS, metavar="4")
+        parser.add_argument('--crawl-threads', dest="crawl_threads", help="Requests in flight while crawling a domain", type=int, default=crawler.DEFAULT_THREADS, metavar="8")
+        parser.add_argument('--crawl-depth', dest="crawl_depth", help="Links followed away from the crawled page", type=int, default=crawler.DEFAULT_DEPTH, metavar="1")
+        parser.add_argument('--max-pages', dest="max_pages", help="Pages fetched per crawled domain, 0 for no limit", type=int, default=0, metavar="500")
+        parser.add_argument('--crawl-budget', dest="crawl_budget", help="Time a domain may be crawled, 0 for no limit", type=duration, default=0, metavar="5m")
+        parser.add_argument('--collapsed', dest="collapsed", help="Save URLs skipped by --per-shape to a file", type=str, metavar="collapsed.txt")
+        parser.add_argument('--journal', dest="journal", help="Record each verdict in a SQLite journal", type=str, metavar=journal.DEFAULT_JOURNAL)
+        parser.add_argument('--resume', dest="resume", help="Skip URLs already in the journal", action='store_true')
+        parser.add_argument('--skip-seen-within', dest="skip_seen_within", help="Skip URLs scanned by a run this recent, their findings are shown again", type=duration, default=0, metavar="7d")
+        parser.add_argument('--seen', dest="seen", help="Where --skip-seen-within keeps the scanned URLs", type=str, default=seen.DEFAULT_SEEN, metavar="~/.sqliv-seen")
+        parser.add_argument('--server-lookup', dest="server_lookup", help="Look up server info on aruljohn.com when responses do not name the server", action='store_true')
+        parser.add_argument('--metrics', dest="metrics", help="Write request counters and latency histograms to a JSON file", type=str, metavar="metrics.json")
+        parser.add_argument('--metrics-prom', dest="metrics_prom", help="Write the metrics to a Prometheus textfile", type=str, metavar="sqliv.prom")
+        parser.add_argument('--metrics-interval', dest="metrics_interval", help="Time between two metrics exports", type=duration, default=metrics.DEFAULT_INTERVAL, metavar="10s")
+        parser.add_argument('--max-body', dest="max_body", help="Stop reading a response after this many bytes", type=int, default=web.MAXBYTES, metavar="1048576")
         return parser
 
-    def process_reverse_lookup(self, args: argparse.Namespace) -> None:
+    def process_reverse_lookup(self, args: argparse.Namespace) -> List:
         """Handle reverse domain lookup scanning"""
         std.stdout(f"Finding domains with same server as {args.target}")
         domains = reverseip.reverseip(args.target)
@@ -119,28 +344,86 @@ class SQLiv:
         if not std.stdin("Do you want to start crawling? [Y/N]", ["Y", "N"], upper=True) == 'Y':
             sys.exit(0)
 
-        vulnerables = []
-        for domain in domains:
-            vulnerables_temp = self.singlescan(domain)
-            if vulnerables_temp:
-                vulnerables.extend(vulnerables_temp)
+        # all domains go through one scan engine, so its worker pool is
+        # shared by the whole run and URLs of a domain are scanned while
+        # the next domains are still being crawled
+        table_data = self.process_vulnerables(self.iterscan(self.crawled(domains)))
 
         std.stdout("Finished scanning all reverse domains")
-        if not vulnerables:
+        if not table_data:
             std.stdout("No vulnerable websites found from reverse domains")
             sys.exit(0)
 
-        std.stdout("Scanning server information")
-        self.process_vulnerables(vulnerables)
+        return table_data
 
-    def process_vulnerables(self, vulnerables: List) -> None:
-        """Process and display vulnerable URLs"""
-        vulnerableurls = [result[0] for result in vulnerables]
-        table_data = serverinfo.check(vulnerableurls)
-        
-        # Add database name to info
-        for result, info in zip(vulnerables, table_data):
-            info.insert(1, result[1])
+    def crawled(self, domains: List[str]) -> Iterator[str]:
+        """
+        Crawl several domains at once with the crawler options.
+
+        Crawlers are created by the caller's thread, as nyawc installs a
+        signal handler which only the main thread may do.
+
+        Yields:
+            URLs of each domain as soon as its crawl finishes
+        """
+        urls = [domain if "://" in domain else "http://" + domain for domain in domains]
+        crawls = crawler.crawlmany(urls, self.crawlworkers, **self.crawloptions)
+
+        def generate() -> Iterator[str]:
+            for url, links in crawls:
+                std.stdout(f"Found {len(links)} URLs from crawling {url}")
+                yield from links
+
+        return generate()
+
+    def process_vulnerables(self, vulnerables: Iterable) -> List:
+        """
+        Fetch server info of vulnerable URLs and display them.
+
+        Server info comes from the headers captured while scanning. With
+        --server-lookup, URLs whose responses named no server are looked
+        up remotely as soon as the generator yields them. The generator
+        is consumed by the caller's thread, so Ctrl-C reaches the scan.
+        """
+        found = []  # [url, db, server, lang] in the order found
+        infos = {}
+        errors = []
+
+        if self.serverlookup:
+            lookups = pipeline.Channel()
+
+            def lookup() -> None:
+                try:
+                    for url, info in serverinfo.itercheck(lookups):
+                        infos[url] = info
+                except BaseException as error:
+                    errors.append(error)
+
+            thread = threading.Thread(target=lookup, daemon=True)
+            thread.start()
+
+        try:
+            for url, db, info in vulnerables:
+                found.append([url, db] + list(info))
+                if self.serverlookup and not any(info):
+                    lookups.put(url)
+        finally:
+            if self.serverlookup:
+                lookups.close()
+
+        if self.serverlookup:
+            try:
+                thread.join()
+            except KeyboardInterrupt:
+                std.stderr("skipping server info scanning process")
+            if errors:
+                raise errors[0]
+
+        if not found:
+            return []
+
+        infos = dict(infos)
+        table_data = [row[:2] + infos.get(row[0], row[2:]) for row in found]
 
         std.fullprint(table_data)
         return table_data
@@ -150,18 +433,24 @@ def main():
     sqliv = SQLiv()
     parser = sqliv.initparser()
     args = parser.parse_args()
+    sqliv.setup(args)
 
     if args.dork and args.engine:
-        sqliv.process_dork_scan(args)
+        table_data = sqliv.process_dork_scan(args)
     elif args.target and args.reverse:
-        sqliv.process_reverse_lookup(args)
+        table_data = sqliv.process_reverse_lookup(args)
     elif args.target:
         vulnerables = sqliv.singlescan(args.target)
         if not vulnerables:
             sys.exit(0)
 
-        std.stdout("Getting server info of domains (this may take a few minutes)")
-        table_data = serverinfo.check([args.target])
+        # server info of the first URL whose responses named their server
+        info = next((each[2] for each in vulnerables if any(each[2])), ['', ''])
+        if not any(info) and args.server_lookup:
+            std.stdout("Getting server info of domains (this may take a few minutes)")
+            table_data = serverinfo.check([args.target])
+        else:
+            table_data = [[args.target] + info]
 
         std.printserverinfo(table_data)
         print("")  # Space between tables
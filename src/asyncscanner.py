@@ -0,0 +1,270 @@
+# asyncio scan engine, keeps many payload probes in flight from one process
+
+import queue
+import asyncio
+import threading
+from urllib.parse import urlparse
+
+from src import std
+from src import scanner
+from src import sqlerrors
+from src import fingerprint
+from src import scheduler
+from src import pipeline
+from src import serverinfo
+from src import metrics
+from src.web import web
+from src.web import aioweb
+
+# number of payload requests in flight at once
+DEFAULT_CONCURRENCY = 500
+
+# urls and payload requests in flight to the same host at once
+DEFAULT_HOSTLIMIT = scheduler.DEFAULT_HOSTLIMIT
+
+
+def scan(urls, concurrency=DEFAULT_CONCURRENCY, maxbytes=web.MAXBYTES,
+         fanout=False, perparam=False, hostlimit=DEFAULT_HOSTLIMIT, baseline=scanner.DEFAULT_BASELINE):
+    """scan multiple websites with a single asyncio event loop
+
+    with fanout all payloads of a url are sent at once and the rest are
+    cancelled on the first SQL error, with perparam each query parameter
+    is also injected on its own; urls answering the first baseline
+    payloads like the untouched url are not sent the other payloads
+    """
+
+    vulnerables = []
+    results = {}  # store scanned results
+
+    try:
+        for url, result in iterscan(urls, concurrency, maxbytes, fanout, perparam, hostlimit, baseline):
+            results[url] = result
+    except KeyboardInterrupt:
+        std.stderr("stopping sqli scanning process")
+
+    for url, result in results.items():
+        if result[0] == True:
+            vulnerables.append((url, result[1]))
+
+    scanner.skipreport(results)
+    return vulnerables
+
+
+def iterscan(urls, concurrency=DEFAULT_CONCURRENCY, maxbytes=web.MAXBYTES,
+             fanout=False, perparam=False, hostlimit=DEFAULT_HOSTLIMIT, baseline=scanner.DEFAULT_BASELINE):
+    """yield (url, (vulnerable, db, skipped, [server, lang])) as soon as each url is scanned
+
+    the event loop runs in its own thread, see scan() for the options;
+    urls may be a pipeline.Channel still being filled by another stage
+    """
+
+    engine = Engine(concurrency, maxbytes, fanout, perparam, hostlimit, baseline)
+    completed = queue.Queue()  # (url, result), None once all are scanned
+
+    thread = threading.Thread(target=engine.start, args=(urls, completed.put), daemon=True)
+    thread.start()
+
+    try:
+        for item in iter(completed.get, None):
+            yield item
+    finally:
+        # no-op if the scan finished, cancels it if interrupted
+        engine.stop()
+        thread.join()
+
+    # raised in the event loop thread, like the SystemExit of a failed search
+    if engine.error is not None:
+        raise engine.error
+
+
+class Engine:
+    """state shared by the probes of one scan"""
+
+    def __init__(self, concurrency, maxbytes, fanout, perparam, hostlimit, baseline):
+        self.concurrency = concurrency
+        self.maxbytes = maxbytes
+        self.fanout = fanout
+        self.perparam = perparam
+        self.hostlimit = hostlimit
+        self.baseline = baseline
+
+        self.loop = asyncio.new_event_loop()
+        self.task = None
+        self.error = None  # ended the scan, raised again by iterscan
+        self.session = None
+        self.hostscheduler = None
+        self.changed = None  # notified when a url may be dispatched
+        self.waking = False
+        self.requests = None  # global limit of requests in flight
+        self.hosts = {}  # netloc -> per host limit of requests in flight
+
+    def start(self, urls, report):
+        """run the scan in a new event loop, report(None) when it ends"""
+
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(self.run(urls, report))
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        except BaseException as error:
+            self.error = error
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+            report(None)
+
+    def stop(self):
+        """cancel the scan from another thread"""
+
+        try:
+            self.loop.call_soon_threadsafe(self.cancel)
+        except RuntimeError:
+            pass  # loop already closed, the scan is over
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def run(self, urls, report):
+        """run the workers sharing one session until all urls are scanned"""
+
+        # input is consumed lazily, a host at its limit waits for its own urls
+        self.hostscheduler = scheduler.HostScheduler(urls, self.hostlimit)
+        self.changed = asyncio.Condition()
+        self.requests = asyncio.Semaphore(self.concurrency)
+
+        # workers waiting for input are woken up when it arrives
+        if isinstance(urls, pipeline.Channel):
+            urls.listen(self.arrived)
+
+        async with aioweb.session(self.concurrency) as self.session:
+            workers = [asyncio.ensure_future(self.worker(report)) for _ in range(self.concurrency)]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                # a failed worker leaves the others to be cancelled
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        # urls read before the input failed are scanned, then it is raised
+        if self.hostscheduler.error is not None:
+            raise self.hostscheduler.error
+
+    def arrived(self):
+        """called from the producer thread when input arrives"""
+
+        # one wake up at a time is enough, workers take all input available
+        if self.waking:
+            return
+        self.waking = True
+        try:
+            self.loop.call_soon_threadsafe(self.wake)
+        except RuntimeError:
+            pass  # loop already closed, the scan is over
+
+    def wake(self):
+        async def notify():
+            self.waking = False
+            async with self.changed:
+                self.changed.notify_all()
+
+        self.loop.create_task(notify())
+
+    async def worker(self, report):
+        """scan urls given by the scheduler until all are dispatched"""
+
+        while True:
+            async with self.changed:
+                url = self.hostscheduler.next()
+                while url is None:
+                    if self.hostscheduler.drained():
+                        self.changed.notify_all()
+                        return
+                    await self.changed.wait()
+                    url = self.hostscheduler.next()
+
+            try:
+                with metrics.timer("sqliv_phase_seconds", phase="scan"):
+                    result = await self.sqli(url)
+            except Exception:
+                # like error_callback of the process engine, one bad url never ends the scan
+                result = (False, None, 0, ['', ''])
+            metrics.count("sqliv_urls_scanned_total", vulnerable=str(bool(result[0])).lower())
+            report((url, result))
+
+            async with self.changed:
+                self.hostscheduler.done(url)
+                self.changed.notify()
+
+    async def sqli(self, url):
+        """check SQL injection vulnerability"""
+
+        websites = scanner.payloadurls(url, self.perparam)
+        db = None
+        skipped = 0
+        headers = {}  # server headers of the responses, for the server info table
+
+        if websites and self.baseline:
+            # untouched url goes out together with the first payloads
+            original = fingerprint.Fingerprint()
+            responses = [fingerprint.Fingerprint() for _ in websites[:self.baseline]]
+            found = await asyncio.gather(self.probe(url, original, headers),
+                                         *[self.probe(website, response, headers) for website, response in zip(websites, responses)])
+
+            db = next((each for each in found[1:] if each != None), None)
+            if db == None and all(response.same(original) for response in responses):
+                skipped = len(websites) - len(responses)
+            websites = websites[len(responses):]
+
+        if db == None and not skipped:
+            if self.fanout:
+                db = await self.race(websites, headers)
+            else:
+                for website in websites:
+                    db = await self.probe(website, headers=headers)
+                    if db != None:
+                        break
+
+        if db != None:
+            std.stdout("scanning {}".format(url), end="")
+            std.showsign(" vulnerable")
+            return True, db, 0, serverinfo.fromheaders(headers)
+
+        std.stdout("scanning {}".format(url))
+        return False, None, skipped, serverinfo.fromheaders(headers)
+
+    async def race(self, websites, headers=None):
+        """probe all websites at once, return the first db found"""
+
+        probes = [asyncio.ensure_future(self.probe(website, headers=headers)) for website in websites]
+        try:
+            for probe in asyncio.as_completed(probes):
+                db = await probe
+                if db != None:
+                    return db
+        finally:
+            # siblings still waiting or downloading are no longer needed
+            for probe in probes:
+                probe.cancel()
+            await asyncio.gather(*probes, return_exceptions=True)
+
+        return None
+
+    async def probe(self, website, response=None, headers=None):
+        """send one payload request, return the db of the SQL error found
+
+        the body is also fed to the response fingerprint if given and
+        the server headers are added to the headers dict if given
+        """
+
+        netloc = urlparse(website).netloc
+        if netloc not in self.hosts:
+            self.hosts[netloc] = asyncio.Semaphore(self.hostlimit)
+
+        async with self.hosts[netloc], self.requests:
+            matcher = sqlerrors.Matcher()
+            feed = scanner.tee(matcher.feed, response.feed) if response else matcher.feed
+            await aioweb.streamhtml(self.session, website, feed, self.maxbytes, headers)
+            return matcher.db
@@ -1,22 +1,47 @@
 import re
+import time
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from lxml import html
 
-#import std
 from nyawc.Options import Options
 from nyawc.QueueItem import QueueItem
 from nyawc.Crawler import Crawler as nyawcCrawler
 from nyawc.CrawlerActions import CrawlerActions
 from nyawc.http.Request import Request
 
+from src import std
+from src import shape
+from src import metrics
+from src.web import web
+
+# urls of dynamic pages taking parameters, worth testing for SQLi
+DYNAMIC = re.compile(r'.(?:php|asp|apsx|jsp)\?.*=')
+
+DEFAULT_WORKERS = 4  # domains crawled at once by crawlmany
+DEFAULT_THREADS = 8  # requests in flight per domain
+DEFAULT_DEPTH = 1
+
 
 class Crawler:
-    def __init__(self):
-        self.links = []
+    def __init__(self, pershape=1, depth=DEFAULT_DEPTH, threads=DEFAULT_THREADS, maxpages=0, budget=0):
+        self.links = {}  # insertion ordered set of the urls found
+        self.pershape = pershape  # pages fetched per url shape, 0 fetches all
+        self.shapes = None
+        self.maxpages = maxpages  # pages fetched per crawl, 0 for no limit
+        self.budget = budget  # seconds a crawl may take, 0 for no limit
+        self.pages = 0
+        self.started = 0
+        self.found = None
         self.crawler = None
-        self.setoptions()
+        self.setoptions(depth, threads)
+
+    def crawl(self, url, found=None):
+        """return the urls worth testing found on the domain of url
+
+        found is called with each of them as soon as it is seen
+        """
 
-    def crawl(self, url):
         if self.crawler is None:
             print("Cralwer is not setted up")
             return
@@ -24,15 +49,28 @@ class Crawler:
         parsedurl = urlparse(url)
         domain = parsedurl.scheme + "://" + parsedurl.netloc
 
-        self.links = []
-        self.crawler.start_with(Request(domain))
-        return self.links
+        # follow redirects of the seed (e.g. http to https) over the shared
+        # pool, with HEAD requests so its page is only fetched by the crawl
+        seed = web.lasturl(domain)
+        if seed:
+            parsedurl = urlparse(seed)
+            domain = parsedurl.scheme + "://" + parsedurl.netloc
+
+        self.links = {}
+        self.shapes = shape.Shapes(self.pershape) if self.pershape else None
+        self.pages = 0
+        self.started = time.monotonic()
+        self.found = found
+        with metrics.timer("sqliv_phase_seconds", phase="crawl"):
+            self.crawler.start_with(Request(domain))
+        return list(self.links)
 
-    def setoptions(self, depth=1):
-        """Define how far user want to crawl"""
+    def setoptions(self, depth=DEFAULT_DEPTH, threads=DEFAULT_THREADS):
+        """Define how far user want to crawl and how many requests run at once"""
 
         options = Options()
         options.scope.max_depth = depth
+        options.performance.max_threads = threads
         options.callbacks.crawler_before_start = self.crawlerstart
         options.callbacks.crawler_after_finish = self.crawlerfinish
         options.callbacks.request_before_start = self.requeststart
@@ -49,13 +87,53 @@ class Crawler:
         pass
 
     def requeststart(self, queue, queue_item):
-        # Called before the crawler starts a new request. Default is a null route.
+        # Called before the crawler starts a new request.
+        # The crawl ends once it fetched maxpages or ran out of budget.
+        if self.maxpages and self.pages >= self.maxpages:
+            return CrawlerActions.DO_STOP_CRAWLING
+        if self.budget and time.monotonic() - self.started >= self.budget:
+            return CrawlerActions.DO_STOP_CRAWLING
+
+        # Pages only differing from fetched ones in parameter values run
+        # the same code, they are dropped without being fetched.
+        if self.shapes is not None and not self.shapes.add(queue_item.request.url):
+            return CrawlerActions.DO_SKIP_TO_NEXT
+
+        self.pages += 1
+        metrics.count("sqliv_crawl_pages_total")
         return CrawlerActions.DO_CONTINUE_CRAWLING
 
     def requestfinish(self, queue, queue_item, new_queue_items):
-        # Called after the crawler finishes a request. Default is a null route.
+        # Called after the crawler finishes a request.
         url = queue_item.request.url
-        if re.search('(.*?)(.php\?|.asp\?|.apsx\?|.jsp\?)(.*?)=(.*?)', url):
-            if not url in self.links:
-                self.links.append(url)
+        if DYNAMIC.search(url) and url not in self.links:
+            self.links[url] = None
+            metrics.count("sqliv_crawl_links_total")
+            if self.found is not None:
+                self.found(url)
         return CrawlerActions.DO_CONTINUE_CRAWLING
+
+
+def crawlmany(urls, workers=DEFAULT_WORKERS, **options):
+    """crawl several domains at once, each with its own Crawler
+
+    returns a generator of (url, links) yielding each domain as soon as
+    its crawl ends, crawls that fail are reported and give no links;
+    options are passed to Crawler. The crawlers are created before returning, as nyawc sets
+    a signal handler which only the main thread may do
+    """
+
+    crawlers = [(url, Crawler(**options)) for url in urls]
+
+    def generate():
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(crawler.crawl, url): url for url, crawler in crawlers}
+            for future in as_completed(futures):
+                try:
+                    links = future.result() or []
+                except Exception as error:
+                    std.stderr(f"Failed to crawl {futures[future]}: {error}")
+                    links = []
+                yield futures[future], links
+
+    return generate()
@@ -0,0 +1,53 @@
+# compact fingerprints of responses, to spot urls ignoring their query string
+
+import re
+import hashlib
+
+# tokens that change between two loads of the same page: timestamps,
+# counters, session ids and csrf tokens
+VOLATILE = re.compile(rb"[0-9a-fA-F]{16,}|[A-Za-z0-9+/_-]{24,}={0,2}|\d+")
+
+# bytes volatile tokens are made of, a chunk is hashed up to the last other byte
+TOKENBYTES = b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz+/_=-"
+
+# bytes carried to the next chunk at most, a longer token is cut and may
+# be kept, which only makes two responses look different
+MAXCARRY = 4096
+
+
+class Fingerprint:
+    """length and hash of a body fed in chunks, with volatile tokens stripped"""
+
+    def __init__(self):
+        self.hash = hashlib.blake2b(digest_size=16)
+        self.length = 0
+        self.carry = b""  # unfinished last token, it may continue in the next chunk
+        self.read = False
+
+    def feed(self, chunk):
+        """add the next chunk of the body, never asks to stop reading"""
+
+        self.read = True
+        data = self.carry + chunk
+        end = max(len(data.rstrip(TOKENBYTES)), len(data) - MAXCARRY)
+        self.carry = data[end:]
+        self.update(data[:end])
+        return False
+
+    def update(self, data):
+        data = VOLATILE.sub(b"", data)
+        self.length += len(data)
+        self.hash.update(data)
+
+    def digest(self):
+        """return (length, hash) of the whole body"""
+
+        if self.carry:
+            self.update(self.carry)
+            self.carry = b""
+        return self.length, self.hash.digest()
+
+    def same(self, other):
+        """tell if both bodies were read and are equal once stripped"""
+
+        return self.read and other.read and self.digest() == other.digest()
@@ -0,0 +1,97 @@
+# append only journal of scan verdicts, lets an interrupted scan resume
+
+import time
+import sqlite3
+import threading
+
+DEFAULT_JOURNAL = "sqliv.journal"
+
+
+class Store:
+    """SQLite database in WAL mode whose rows are written in batches
+
+    subclasses give the CREATE TABLE statement of their table and the
+    INSERT statement of their rows
+    """
+
+    schema = None
+    insert = None
+
+    def __init__(self, path, batchsize=1000, interval=1.0):
+        self.path = path
+        self.batchsize = batchsize  # rows per transaction
+        self.interval = interval  # seconds a row may wait in memory
+        self.pending = []
+        self.timer = None  # flushes the pending rows once interval has passed
+
+        # used by the scan stage thread and the timer, calls are serialized by the lock
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent on crash, NORMAL only risks the last batches
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(self.schema)
+        self.connection.commit()
+
+    def add(self, row):
+        """queue a row, written with the next batch or after interval at most"""
+
+        with self.lock:
+            self.pending.append(row)
+
+            if len(self.pending) >= self.batchsize:
+                self.flush()
+            elif self.timer is None:
+                # the batch is written on time even if no other row comes
+                self.timer = threading.Timer(self.interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """write the pending rows in one transaction"""
+
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.pending:
+                with self.connection:
+                    self.connection.executemany(self.insert, self.pending)
+                self.pending = []
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.connection.close()
+
+
+class Journal(Store):
+    """verdicts of scanned urls, by url"""
+
+    schema = ("CREATE TABLE IF NOT EXISTS verdicts ("
+              "url TEXT PRIMARY KEY, vulnerable INTEGER, db TEXT, skipped INTEGER, scanned REAL)")
+    insert = "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?)"
+
+    def __init__(self, path=DEFAULT_JOURNAL, batchsize=1000, interval=1.0):
+        super().__init__(path, batchsize, interval)
+        self.resumed = []  # (url, db) found vulnerable by a previous run
+
+    def record(self, url, result):
+        """add the verdict of a scanned url"""
+
+        vulnerable, db, skipped = result[:3]
+        self.add((url, int(bool(vulnerable)), db, skipped, time.time()))
+
+    def unscanned(self, urls):
+        """yield the urls without a verdict, keeping earlier findings in resumed"""
+
+        scanned = {}
+        with self.lock:
+            for url, vulnerable, db in self.connection.execute("SELECT url, vulnerable, db FROM verdicts"):
+                scanned[url] = db if vulnerable else None
+
+        for url in urls:
+            if url not in scanned:
+                yield url
+            elif scanned[url] is not None:
+                self.resumed.append((url, scanned[url]))
@@ -0,0 +1,224 @@
+# counters and latency histograms of a run, exported as JSON and Prometheus text
+#
+# nothing is recorded until enable() is called; worker processes collect
+# into their own copy and send delta() back with each result, which the
+# parent adds with merge()
+
+import json
+import time
+import bisect
+import atexit
+import threading
+import functools
+
+from src import std
+
+# upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+DEFAULT_INTERVAL = 10.0  # seconds between two exports
+
+enabled = False
+
+lock = threading.Lock()
+counters = {}  # (name, labels) -> value
+histograms = {}  # (name, labels) -> [count per bucket..., sum]
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def reset():
+    """forget everything recorded, workers start with it as they inherit the parent's metrics"""
+
+    global counters, histograms
+
+    with lock:
+        counters, histograms = {}, {}
+
+
+def count(name, value=1, **labels):
+    """add value to a counter"""
+
+    if not enabled:
+        return
+
+    key = (name, tuple(sorted(labels.items())))
+    with lock:
+        counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """add a duration to a histogram"""
+
+    if not enabled:
+        return
+
+    key = (name, tuple(sorted(labels.items())))
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * (len(BUCKETS) + 1)
+        histogram[index] += 1
+        histogram[-1] += seconds
+
+
+class timer:
+    """observe the time spent in a with block"""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+
+def timed(name):
+    """decorator counting the calls of a function and the seconds spent in it"""
+
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                count(name + "_seconds_total", time.perf_counter() - started)
+                count(name + "_calls_total")
+
+        return wrapper
+
+    return decorate
+
+
+def status(code):
+    """return the class label of an HTTP status, like 2xx"""
+
+    return "{}xx".format(code // 100)
+
+
+def delta():
+    """return what was recorded since the last call and forget it, None if disabled"""
+
+    global counters, histograms
+
+    if not enabled:
+        return None
+
+    with lock:
+        recorded = (counters, histograms)
+        counters, histograms = {}, {}
+    return recorded
+
+
+def merge(recorded):
+    """add a delta() of another process"""
+
+    if not recorded:
+        return
+
+    with lock:
+        for key, value in recorded[0].items():
+            counters[key] = counters.get(key, 0) + value
+        for key, buckets in recorded[1].items():
+            histogram = histograms.get(key)
+            if histogram is None:
+                histograms[key] = list(buckets)
+                continue
+            for index, value in enumerate(buckets):
+                histogram[index] += value
+
+
+def snapshot():
+    """return the metrics as a JSON serializable dict"""
+
+    with lock:
+        recorded = (dict(counters), {key: list(buckets) for key, buckets in histograms.items()})
+
+    result = {"time": time.time(), "counters": [], "histograms": []}
+    for (name, labels), value in sorted(recorded[0].items()):
+        result["counters"].append({"name": name, "labels": dict(labels), "value": value})
+
+    for (name, labels), buckets in sorted(recorded[1].items()):
+        result["histograms"].append({
+            "name": name,
+            "labels": dict(labels),
+            "buckets": [["+Inf" if bound == float("inf") else bound, hits] for bound, hits in zip(BUCKETS, buckets)],
+            "count": sum(buckets[:-1]),
+            "sum": buckets[-1],
+        })
+
+    return result
+
+
+def prometheus():
+    """return the metrics in the Prometheus text exposition format"""
+
+    def labelled(name, labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return name
+        text = ",".join('{}="{}"'.format(label, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                        for label, value in pairs)
+        return "{}{{{}}}".format(name, text)
+
+    with lock:
+        recorded = (dict(counters), {key: list(buckets) for key, buckets in histograms.items()})
+
+    lines = []
+    typed = set()
+    for (name, labels), value in sorted(recorded[0].items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append("# TYPE {} counter".format(name))
+        lines.append("{} {}".format(labelled(name, labels), value))
+
+    for (name, labels), buckets in sorted(recorded[1].items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append("# TYPE {} histogram".format(name))
+        cumulative = 0
+        for bound, hits in zip(BUCKETS, buckets):
+            cumulative += hits
+            bound = "+Inf" if bound == float("inf") else bound
+            lines.append("{} {}".format(labelled(name + "_bucket", labels, [("le", bound)]), cumulative))
+        lines.append("{} {}".format(labelled(name + "_sum", labels), buckets[-1]))
+        lines.append("{} {}".format(labelled(name + "_count", labels), cumulative))
+
+    return "\n".join(lines) + "\n"
+
+
+def export(jsonpath=None, prometheuspath=None):
+    """write the metrics to the given files, each replaced atomically"""
+
+    for path, content in ((jsonpath, lambda: json.dumps(snapshot(), indent=4)), (prometheuspath, prometheus)):
+        if not path:
+            continue
+        # the node exporter textfile collector must never read half a file
+        with std.atomicwrite(path, permissions=0o644) as exported:
+            exported.write(content())
+
+
+def start(jsonpath=None, prometheuspath=None, interval=DEFAULT_INTERVAL):
+    """enable metrics and export them every interval seconds and at exit"""
+
+    enable()
+
+    def run():
+        while True:
+            time.sleep(interval)
+            export(jsonpath, prometheuspath)
+
+    threading.Thread(target=run, daemon=True).start()
+    atexit.register(export, jsonpath, prometheuspath)
@@ -0,0 +1,96 @@
+# bounded channels connecting stages that run in their own threads
+
+import queue
+import threading
+
+# returned by Channel.poll when no item is ready yet
+EMPTY = object()
+
+# items buffered between two stages before the producer blocks
+DEFAULT_MAXSIZE = 1000
+
+CLOSED = object()
+
+
+class Channel:
+    """bounded queue from a producer thread, closed when the producer ends
+
+    iterating blocks for the next item, poll() never blocks so an engine can
+    keep collecting results while waiting for input; listeners are called
+    from the producer thread on every put
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.queue = queue.Queue(maxsize)
+        self.listeners = []
+        self.error = None
+        self.finished = False
+
+    def put(self, item):
+        """add an item, blocks while the channel is full"""
+
+        self.queue.put(item)
+        self.notify()
+
+    def close(self, error=None):
+        """end the channel, the consumer re-raises error if given"""
+
+        self.error = error
+        self.queue.put(CLOSED)
+        self.notify()
+
+    def listen(self, callback):
+        self.listeners.append(callback)
+
+    def notify(self):
+        for callback in self.listeners:
+            callback()
+
+    def poll(self):
+        """return the next item or EMPTY, raise StopIteration once closed"""
+
+        if self.finished:
+            raise StopIteration
+
+        try:
+            item = self.queue.get_nowait()
+        except queue.Empty:
+            return EMPTY
+
+        return self.take(item)
+
+    def take(self, item):
+        if item is CLOSED:
+            self.finished = True
+            if self.error is not None:
+                raise self.error
+            raise StopIteration
+
+        return item
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.finished:
+            raise StopIteration
+
+        return self.take(self.queue.get())
+
+
+def stage(iterable, maxsize=DEFAULT_MAXSIZE):
+    """iterate over iterable in a new thread, return the Channel of its items"""
+
+    channel = Channel(maxsize)
+
+    def run():
+        try:
+            for item in iterable:
+                channel.put(item)
+        except BaseException as error:
+            channel.close(error)
+        else:
+            channel.close()
+
+    threading.Thread(target=run, daemon=True).start()
+    return channel
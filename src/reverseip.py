@@ -1,53 +1,173 @@
 # Reverse Domain Lookup
 
+import os
 import sys
+import json
+import time
+import socket
+import threading
+import urllib.error
 import urllib.parse
 import urllib.request
-import json
 from urllib.parse import urlparse
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from src import std
+from src.web import useragents
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".sqliv-reverseip")
+DEFAULT_TTL = 24 * 3600  # seconds a lookup of an address is trusted
+DEFAULT_WORKERS = 8  # addresses looked up at once
+
+
+class YouGetSignal:
+    """reverse IP lookup backend using domains.yougetsignal.com
+
+    a backend has a lookup(address) method returning the domains hosted
+    on the address and raising LookupError when the service refuses
+    """
+
+    def __init__(self, source="http://domains.yougetsignal.com/domains.php"):
+        self.source = source
+
+    def lookup(self, address):
+        contenttype = "application/x-www-form-urlencoded; charset=UTF-8"
+
+        # POST method
+        data = urllib.parse.urlencode([('remoteAddress', address), ('key', '')]).encode('utf-8')
 
-from web import useragents
+        request = urllib.request.Request(self.source, data, useragents.get())
+        request.add_header("Content-type", contenttype)
+
+        obj = json.loads(urllib.request.urlopen(request, timeout=30).read().decode('utf-8'))
+
+        # if successful
+        if obj["status"] == 'Success':
+            return [domain[0] for domain in obj["domainArray"]]
+
+        raise LookupError(obj["message"])
+
+
+backend = YouGetSignal()
+
+lock = threading.Lock()
+known = {}  # address -> (domains, time looked up)
+cachefile = None  # where save() writes known, set by load()
 
 
 def reverseip(url):
     """return domains from given the same server"""
 
-    # get only domain name
-    url = urlparse(url).netloc if urlparse(url).netloc != '' else urlparse(url).path.split("/")[0]
+    return reverseips([url])[url]
+
+
+def reverseips(urls, workers=DEFAULT_WORKERS, ttl=DEFAULT_TTL):
+    """return {url: domains} of the servers hosting each url
+
+    domains are resolved and looked up concurrently, urls resolving to
+    the same address share one lookup and addresses looked up within
+    ttl seconds are not looked up at all
+    """
+
+    # group targets by their domain, each is resolved once
+    names = {}
+    for url in urls:
+        names.setdefault(domain(url), []).append(url)
 
-    source = "http://domains.yougetsignal.com/domains.php"
-    useragent = useragents.get()
-    contenttype = "application/x-www-form-urlencoded; charset=UTF-8"
+    lookups = {}  # address -> Future of its lookup, shared by the domains resolving to it
 
-    # POST method
-    opener = urllib.request.build_opener(
-        urllib.request.HTTPHandler(), urllib.request.HTTPSHandler())
-    data = urllib.parse.urlencode([('remoteAddress', url), ('key', '')]).encode('utf-8')
+    def find(name):
+        address = resolve(name)
+        with lock:
+            if address in known and time.time() - known[address][1] <= ttl:
+                return known[address][0]
+            future = lookups.get(address)
+            first = future is None
+            if first:
+                future = lookups[address] = Future()
 
-    request = urllib.request.Request(source, data)
-    request.add_header("Content-type", contenttype)
-    request.add_header("User-Agent", useragent)
+        # the first domain resolving to the address looks it up, the others wait for it
+        if first:
+            try:
+                future.set_result(__lookup(address))
+            except BaseException as error:
+                future.set_exception(error)
+                raise
+        return future.result()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        found = dict(zip(names, executor.map(find, names)))
+
+    return {url: found[name] for name, targets in names.items() for url in targets}
+
+
+def __lookup(address):
+    """look up an address with the backend, failures are reported and return no domains"""
 
     try:
-        result = urllib.request.urlopen(request).read().decode('utf-8')
+        domains = backend.lookup(address)
 
     except urllib.error.HTTPError as e:
         print("[{}] HTTP error".format(e.code), file=sys.stderr)
+        return []
 
     except urllib.error.URLError as e:
         print("URL error, {}".format(e.reason), file=sys.stderr)
+        return []
+
+    except LookupError as e:
+        print("[ERR] {}".format(e), file=sys.stderr)
+        return []
 
-    except:
+    except Exception:
         print("HTTP exception", file=sys.stderr)
+        return []
+
+    with lock:
+        known[address] = (domains, time.time())
+    return domains
+
+
+def domain(url):
+    """get only domain name"""
+
+    return urlparse(url).netloc if urlparse(url).netloc != '' else urlparse(url).path.split("/")[0]
+
+
+def resolve(name):
+    """return the address a domain resolves to, the domain itself if it does not"""
+
+    try:
+        return socket.gethostbyname(name.split(":")[0])
+    except (OSError, UnicodeError):
+        return name
+
+
+def load(path=DEFAULT_CACHE):
+    """add the lookups saved by previous runs to known"""
+
+    global cachefile
+
+    cachefile = path
+    saved = std.readjson(path)
+    if saved is None:
+        return
+
+    with lock:
+        for address, (domains, looked) in saved.items():
+            if address not in known or known[address][1] < looked:
+                known[address] = (domains, looked)
+
+
+def save(ttl=DEFAULT_TTL):
+    """write the lookups younger than ttl seconds to the file given to load()"""
 
-    obj = json.loads(result)
+    if cachefile is None:
+        return
 
-    # if successful
-    if obj["status"] == 'Success':
-        domains = []
-        for domain in obj["domainArray"]:
-            domains.append(domain[0])
-        return domains
+    now = time.time()
+    with lock:
+        saved = {address: list(entry) for address, entry in known.items() if now - entry[1] <= ttl}
 
-    print("[ERR] {}".format(obj["message"]), file=sys.stderr)
-    return []
+    if not std.writejson(saved, cachefile):
+        print("could not save reverse IP lookups to {}".format(cachefile), file=sys.stderr)
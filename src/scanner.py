@@ -1,72 +1,188 @@
-import time
+import queue
 import signal
 import multiprocessing
 from urllib.parse import urlparse
 
-import std
-import sqlerrors
-from web import web
+from src import std
+from src import sqlerrors
+from src import fingerprint
+from src import scheduler
+from src import pipeline
+from src import serverinfo
+from src import metrics
+from src.web import web
+
+# appended to every query parameter value, one variant per request
+payloads = ("'", "')", "';", '"', '")', '";', '`', '`)', '`;', '\\', "%27", "%%2727", "%25%27", "%60", "%5C")
+
+# payload responses compared with the untouched url before giving up on it
+DEFAULT_BASELINE = 2
 
 
 def init():
     signal.signal(signal.SIGINT, signal.SIG_IGN)
+    metrics.reset()
 
-def scan(urls):
+def scan(urls, maxbytes=web.MAXBYTES, baseline=DEFAULT_BASELINE, hostlimit=scheduler.DEFAULT_HOSTLIMIT):
     """scan multiple websites with multi processing"""
 
     vulnerables = []
     results = {}  # store scanned results
 
-    childs = []  # store child processes
+    try:
+        for url, result in iterscan(urls, maxbytes, baseline, hostlimit):
+            results[url] = result
+    except KeyboardInterrupt:
+        std.stderr("stopping sqli scanning process")
+
+    for url, result in results.items():
+        if result[0] == True:
+            vulnerables.append((url, result[1]))
+
+    skipreport(results)
+    return vulnerables
+
+
+def iterscan(urls, maxbytes=web.MAXBYTES, baseline=DEFAULT_BASELINE, hostlimit=scheduler.DEFAULT_HOSTLIMIT):
+    """yield (url, (vulnerable, db, skipped, [server, lang])) as soon as each url is scanned
+
+    server and lang come from the headers of the responses to the url
+
+    urls may be a pipeline.Channel still being filled by another stage
+    """
+
     max_processes = multiprocessing.cpu_count() * 2
     pool = multiprocessing.Pool(max_processes, init)
 
-    for url in urls:
-        def callback(result, url=url):
-            results[url] = result
-        childs.append(pool.apply_async(__sqli, (url, ), callback=callback))
+    # a few tasks queued per process keep the workers busy between results
+    hosts = scheduler.HostScheduler(urls, hostlimit, max_processes * 2)
+    completed = queue.Queue()  # (url, result) of finished child processes
+
+    # None wakes the loop up when input arrives
+    if isinstance(urls, pipeline.Channel):
+        urls.listen(lambda: completed.put(None))
+
+    def dispatch():
+        url = hosts.next()
+        while url is not None:
+            def callback(result, url=url):
+                # metrics recorded by the child come back with its verdict
+                metrics.merge(result[4])
+                completed.put((url, result[:4]))
+            def error_callback(error, url=url):
+                completed.put((url, (False, None, 0, ['', ''])))
+            pool.apply_async(__task, (url, maxbytes, baseline), callback=callback, error_callback=error_callback)
+            url = hosts.next()
 
     try:
-        while True:
-            time.sleep(0.5)
-            if all([child.ready() for child in childs]):
-                break
-    except KeyboardInterrupt:
-        std.stderr("stopping sqli scanning process")
+        dispatch()
+        while not hosts.finished():
+            item = completed.get()
+            if item is None:
+                dispatch()
+                continue
+
+            url, result = item
+            hosts.done(url)
+            dispatch()
+            yield url, result
+
+        if hosts.error is not None:
+            raise hosts.error
+    except BaseException:
+        # interrupted or the caller stopped iterating
         pool.terminate()
         pool.join()
+        raise
     else:
         pool.close()
         pool.join()
 
-    for url, result in results.items():
-        if result[0] == True:
-            vulnerables.append((url, result[1]))
 
-    return vulnerables
+def skipreport(results):
+    """show how many payload requests the baseline comparison saved"""
+
+    skipped = [result[2] for result in results.values() if result[2]]
+    if skipped:
+        std.stdout("skipped {} payload requests to {} urls ignoring their query".format(sum(skipped), len(skipped)))
+
+
+def tee(*feeds):
+    """return a feed passing each chunk to all feeds, stopping when one asks to"""
+
+    def feed(chunk):
+        return any([feed(chunk) for feed in feeds])
+
+    return feed
 
 
-def __sqli(url):
+def __task(url, maxbytes, baseline):
+    """run in child process, return the verdict and the metrics recorded meanwhile"""
+
+    with metrics.timer("sqliv_phase_seconds", phase="scan"):
+        result = __sqli(url, maxbytes, baseline)
+
+    metrics.count("sqliv_urls_scanned_total", vulnerable=str(bool(result[0])).lower())
+    return result + (metrics.delta(),)
+
+
+def __sqli(url, maxbytes=web.MAXBYTES, baseline=DEFAULT_BASELINE):
     """check SQL injection vulnerability"""
 
     std.stdout("scanning {}".format(url), end="")
 
+    websites = payloadurls(url)
+    # no queries in url
+    if not websites:
+        print("")  # move cursor to new line
+        return False, None, 0, ['', '']
+
+    headers = {}  # server headers of the responses, for the server info table
+
+    # untouched response, payloads answered the same way are ignored by the url
+    original = None
+    if baseline:
+        original = fingerprint.Fingerprint()
+        web.streamhtml(url, original.feed, maxbytes, headers)
+
+    for index, website in enumerate(websites):
+        # the body is matched while it downloads and dropped on the first error
+        matcher = sqlerrors.Matcher()
+        response = fingerprint.Fingerprint()
+        web.streamhtml(website, tee(matcher.feed, response.feed), maxbytes, headers)
+        if matcher.db != None:
+            std.showsign(" vulnerable")
+            return True, matcher.db, 0, serverinfo.fromheaders(headers)
+
+        if original is not None and index < baseline:
+            if not response.same(original):
+                original = None
+            elif index + 1 == baseline:
+                print("")  # move cursor to new line
+                return False, None, len(websites) - baseline, serverinfo.fromheaders(headers)
+
+    print("")  # move cursor to new line
+    return False, None, 0, serverinfo.fromheaders(headers)
+
+
+def payloadurls(url, perparam=False):
+    """return the url with each payload appended to all of its query values
+
+    with perparam, variants injecting a single parameter at a time follow
+    """
+
     domain = url.split("?")[0]  # domain with path without queries
     queries = urlparse(url).query.split("&")
     # no queries in url
     if not any(queries):
-        print("")  # move cursor to new line
-        return False, None
-
-    payloads = ("'", "')", "';", '"', '")', '";', '`', '`)', '`;', '\\', "%27", "%%2727", "%25%27", "%60", "%5C")
-    for payload in payloads:
-        website = domain + "?" + ("&".join([param + payload for param in queries]))
-        source = web.gethtml(website)
-        if source:
-            vulnerable, db = sqlerrors.check(source)
-            if vulnerable and db != None:
-                std.showsign(" vulnerable")
-                return True, db
+        return []
 
-    print("")  # move cursor to new line
-    return False, None
+    websites = [domain + "?" + ("&".join([param + payload for param in queries])) for payload in payloads]
+
+    if perparam and len(queries) > 1:
+        for index in range(len(queries)):
+            for payload in payloads:
+                injected = [param + payload if position == index else param for position, param in enumerate(queries)]
+                websites.append(domain + "?" + "&".join(injected))
+
+    return websites
@@ -0,0 +1,110 @@
+# host fair dispatching of urls to the scan workers
+
+from collections import deque
+
+from src import shape
+from src import pipeline
+
+# urls in flight to the same host at once
+DEFAULT_HOSTLIMIT = 8
+
+# urls read ahead from the input to find other hosts to dispatch
+DEFAULT_LOOKAHEAD = 100000
+
+
+class HostScheduler:
+    """round robin over per host queues, capped per host and in total
+
+    urls are read lazily from the given iterable, up to lookahead of them
+    are kept queued so a slow host never holds back the others; a
+    pipeline.Channel is polled so waiting for input never blocks
+
+    an error raised by the input ends it, urls already read are still
+    dispatched and the engine raises the error once they are done
+    """
+
+    def __init__(self, urls, hostlimit=DEFAULT_HOSTLIMIT, globallimit=None, lookahead=DEFAULT_LOOKAHEAD):
+        self.urls = urls.poll if isinstance(urls, pipeline.Channel) else iter(urls).__next__
+        self.hostlimit = hostlimit
+        self.globallimit = globallimit
+        self.lookahead = lookahead
+
+        self.queues = {}  # host -> deque of urls waiting
+        self.inflight = {}  # host -> urls dispatched and not done
+        self.ready = deque()  # hosts with waiting urls and a free slot, in turn
+        self.inready = set()
+        self.waiting = 0
+        self.running = 0
+        self.exhausted = False
+        self.error = None  # raised by the input, like the SystemExit of a failed search
+
+    def fill(self):
+        """read input until lookahead urls are waiting"""
+
+        while not self.exhausted and self.waiting < self.lookahead:
+            try:
+                url = self.urls()
+            except StopIteration:
+                self.exhausted = True
+                break
+            except (Exception, SystemExit) as error:
+                self.exhausted = True
+                self.error = error
+                break
+
+            if url is pipeline.EMPTY:
+                break
+
+            key = shape.host(url)
+            self.queues.setdefault(key, deque()).append(url)
+            self.waiting += 1
+            self.wake(key)
+
+    def wake(self, key):
+        """put the host in turn if it has waiting urls and a free slot"""
+
+        if key not in self.inready and self.queues.get(key) and self.inflight.get(key, 0) < self.hostlimit:
+            self.ready.append(key)
+            self.inready.add(key)
+
+    def next(self):
+        """return the next url to dispatch, or None if none may go now"""
+
+        self.fill()
+        if not self.ready or (self.globallimit and self.running >= self.globallimit):
+            return None
+
+        key = self.ready.popleft()
+        self.inready.discard(key)
+
+        url = self.queues[key].popleft()
+        if not self.queues[key]:
+            del self.queues[key]
+        self.waiting -= 1
+        self.running += 1
+        self.inflight[key] = self.inflight.get(key, 0) + 1
+
+        # back of the line, other hosts go first
+        self.wake(key)
+        return url
+
+    def done(self, url):
+        """free the slot held by a dispatched url"""
+
+        key = shape.host(url)
+        self.running -= 1
+        self.inflight[key] -= 1
+        if not self.inflight[key]:
+            del self.inflight[key]
+        self.wake(key)
+
+    def drained(self):
+        """tell if every url has been dispatched"""
+
+        self.fill()
+        return self.exhausted and not self.waiting
+
+    def finished(self):
+        """tell if every url has been dispatched and is done"""
+
+        return self.drained() and not self.running
@@ -0,0 +1,135 @@
+# urls scanned by previous runs, lets daily reruns of a dork skip them
+
+import os
+import math
+import time
+import hashlib
+
+from src import std
+from src import journal
+
+DEFAULT_SEEN = os.path.join(os.path.expanduser("~"), ".sqliv-seen")
+DEFAULT_CAPACITY = 10 * 1000 * 1000  # urls the filter holds at its error rate
+DEFAULT_ERRORRATE = 0.01
+
+
+def canonical(url):
+    """return the url with lowercased scheme and host, no fragment and sorted parameters"""
+
+    # plain string splitting like shape.shape
+    base, _, query = url.partition("#")[0].partition("?")
+    scheme, separator, rest = base.partition("://")
+    if not separator:
+        scheme, rest = "http", base
+    host, slash, path = rest.partition("/")
+
+    params = sorted(param for param in query.split("&") if param)
+    return scheme.lower() + "://" + host.lower() + "/" + path + ("?" + "&".join(params) if params else "")
+
+
+def key(url):
+    """return the 16 byte digest a url is stored by"""
+
+    return hashlib.blake2b(canonical(url).encode("utf-8", "ignore"), digest_size=16).digest()
+
+
+class BloomFilter:
+    """set of digests in a fixed bit array, may answer True for a missing one"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, errorrate=DEFAULT_ERRORRATE):
+        self.size = max(8, int(-capacity * math.log(errorrate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, digest):
+        # double hashing with both halves of the digest
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, digest):
+        for position in self.positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(digest))
+
+    def load(self, path):
+        """read bits saved by save(), return False if missing or of another size"""
+
+        try:
+            with open(path, "rb") as saved:
+                bits = saved.read()
+        except OSError:
+            return False
+
+        if len(bits) != len(self.bits):
+            return False
+        self.bits = bytearray(bits)
+        return True
+
+    def save(self, path):
+        with std.atomicwrite(path, "wb") as saved:
+            saved.write(self.bits)
+
+
+class SeenStore(journal.Store):
+    """verdicts of scanned urls in SQLite, with a bloom filter in front
+
+    the filter answers most lookups of new urls from memory, only the
+    urls it may hold are looked up on disk
+    """
+
+    schema = ("CREATE TABLE IF NOT EXISTS seen ("
+              "key BLOB PRIMARY KEY, scanned REAL, vulnerable INTEGER, db TEXT) WITHOUT ROWID")
+    insert = "INSERT OR REPLACE INTO seen VALUES (?, ?, ?, ?)"
+
+    def __init__(self, path=DEFAULT_SEEN, capacity=DEFAULT_CAPACITY, batchsize=1000):
+        super().__init__(path, batchsize)
+        self.recalled = []  # (url, db) found vulnerable by a recent run
+        self.skipped = 0  # urls left out by unseen()
+
+        self.filter = BloomFilter(capacity)
+        if not self.filter.load(path + ".bloom"):
+            # lost or resized, rebuilt from the index
+            for (digest,) in self.connection.execute("SELECT key FROM seen"):
+                self.filter.add(digest)
+
+    def lookup(self, url):
+        """return (scanned, vulnerable, db) of the last scan of url, None if never scanned"""
+
+        digest = key(url)
+        if digest not in self.filter:
+            return None
+
+        with self.lock:
+            return self.connection.execute(
+                "SELECT scanned, vulnerable, db FROM seen WHERE key = ?", (digest,)).fetchone()
+
+    def unseen(self, urls, within):
+        """yield the urls not scanned within the last seconds, keeping recent findings in recalled"""
+
+        since = time.time() - within
+        for url in urls:
+            found = self.lookup(url)
+            if found is None or found[0] < since:
+                yield url
+                continue
+
+            self.skipped += 1
+            if found[1]:
+                self.recalled.append((url, found[2]))
+
+    def record(self, url, result):
+        """add the verdict of a scanned url"""
+
+        digest = key(url)
+        self.filter.add(digest)
+        self.add((digest, time.time(), int(bool(result[0])), result[1]))
+
+    def close(self):
+        super().close()
+        try:
+            self.filter.save(self.path + ".bloom")
+        except OSError:
+            pass
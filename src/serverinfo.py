@@ -1,17 +1,39 @@
 # get server information of given domain
 
+import os
 import time
+import queue
 import signal
+import threading
 import multiprocessing
 import bs4
 from urllib.parse import urlparse
 
-import std
-from web import web
+from src import std
+from src import metrics
+from src.web import web
 
+# remote lookup page of a domain, followed by the domain name
+LOOKUP = "https://aruljohn.com/webserver/"
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".sqliv-serverinfo")
+DEFAULT_TTL = 7 * 24 * 3600  # seconds a saved lookup is trusted
+
+END = object()  # marks the end of the urls to look up
+
+known = {}  # domain -> [server, lang] looked up by this process or loaded
+lookedup = {}  # domain -> time a loaded info was looked up
+cachefile = None  # where save() writes known, set by load()
 
 def init():
     signal.signal(signal.SIGINT, signal.SIG_IGN)
+    metrics.reset()
+
+def fromheaders(headers):
+    """[server, lang] of the SERVERHEADERS captured while scanning"""
+
+    return [headers.get("Server", ""), headers.get("X-Powered-By", "")]
+
 
 def check(urls):
     """get many domains' server info with multi processing"""
@@ -19,27 +41,11 @@ def check(urls):
     domains_info = []  # return in list for termtable input
     results = {}  # store results
 
-    childs = []  # store child processes
-    max_processes = multiprocessing.cpu_count() * 2
-    pool = multiprocessing.Pool(max_processes, init)
-
-    for url in urls:
-        def callback(result, url=url):
-            results[url] = result
-        childs.append(pool.apply_async(__getserverinfo, (url, ), callback=callback))
-
     try:
-        while True:
-            time.sleep(0.5)
-            if all([child.ready() for child in childs]):
-                break
+        for url, result in itercheck(urls):
+            results[url] = result
     except KeyboardInterrupt:
         std.stderr("skipping server info scanning process")
-        pool.terminate()
-        pool.join()
-    else:
-        pool.close()
-        pool.join()
 
     # if user skipped the process, some may not have information
     # so put - for empty data
@@ -54,13 +60,132 @@ def check(urls):
     return domains_info
 
 
+def itercheck(urls):
+    """yield (url, [server, lang]) as soon as the lookup of its domain finishes
+
+    each domain is looked up once and its info given to all of its urls,
+    domains in known are not looked up again; urls may be a generator,
+    it is read in its own thread as lookups go
+    """
+
+    max_processes = multiprocessing.cpu_count() * 2
+    pool = multiprocessing.Pool(max_processes, init)
+
+    lock = threading.Lock()
+    waiting = {}  # domain -> its urls waiting for the lookup
+    completed = queue.Queue()  # (domain, info), an input error or END
+
+    def lookup(netloc):
+        def callback(result):
+            # metrics recorded by the child come back with the info
+            info, recorded = result
+            metrics.merge(recorded)
+            completed.put((netloc, info))
+        def error_callback(error):
+            completed.put((netloc, ['', '']))
+        pool.apply_async(__lookup, (netloc,), callback=callback, error_callback=error_callback)
+
+    def feed():
+        try:
+            for url in urls:
+                netloc = domain(url)
+                with lock:
+                    pending = netloc in waiting
+                    waiting.setdefault(netloc, []).append(url)
+                if netloc in known:
+                    completed.put((netloc, known[netloc]))
+                elif not pending:
+                    lookup(netloc)
+        except BaseException as error:
+            completed.put(error)
+        completed.put(END)
+
+    threading.Thread(target=feed, daemon=True).start()
+
+    try:
+        fed = False
+        while not fed or waiting:
+            item = completed.get()
+            if item is END:
+                fed = True
+                continue
+            if isinstance(item, BaseException):
+                raise item
+
+            netloc, info = item
+            with lock:
+                known[netloc] = info
+                found = waiting.pop(netloc, [])
+            for url in found:
+                yield url, info
+    except BaseException:
+        # interrupted or the caller stopped iterating
+        pool.terminate()
+        pool.join()
+        raise
+    else:
+        pool.close()
+        pool.join()
+
+
+def domain(url):
+    """return the netloc a url is looked up by"""
+
+    return urlparse(url).netloc if urlparse(url).netloc != '' else urlparse(url).path.split("/")[0]
+
+
+def load(path=DEFAULT_CACHE, ttl=DEFAULT_TTL):
+    """add the infos saved by previous runs within ttl seconds to known"""
+
+    global cachefile
+
+    cachefile = path
+    saved = std.readjson(path)
+    if saved is None:
+        return
+
+    now = time.time()
+    for netloc, (server, lang, looked) in saved.items():
+        if now - looked <= ttl and netloc not in known:
+            known[netloc] = [server, lang]
+            lookedup[netloc] = looked
+
+
+def save():
+    """write the infos found in known to the file given to load()"""
+
+    if cachefile is None:
+        return
+
+    now = time.time()
+    saved = {netloc: info + [lookedup.get(netloc, now)] for netloc, info in known.items() if any(info)}
+
+    if not std.writejson(saved, cachefile):
+        std.stderr("could not save server info to {}".format(cachefile))
+
+
+def __lookup(netloc):
+    """run in child process, failures are returned as empty info
+
+    the metrics recorded meanwhile are returned with the info
+    """
+
+    try:
+        with metrics.timer("sqliv_phase_seconds", phase="serverinfo"):
+            info = __getserverinfo(netloc)
+    except Exception:
+        info = []
+
+    return info + [''] * (2 - len(info)), metrics.delta()
+
+
 def __getserverinfo(url):
     """get server name and version of given domain"""
 
-    url = urlparse(url).netloc if urlparse(url).netloc != '' else urlparse(url).path.split("/")[0]
+    url = domain(url)
 
     info = []  # to store server info
-    url = "https://aruljohn.com/webserver/" + url
+    url = LOOKUP + url
 
     try:
         result = web.gethtml(url)
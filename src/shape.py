@@ -0,0 +1,53 @@
+# url shapes, urls differing only in parameter values run the same code
+
+
+def shape(url):
+    """return scheme, host, path and sorted parameter names of the url"""
+
+    # plain string splitting, urlsplit is several times slower on big lists
+    base, _, query = url.partition("#")[0].partition("?")
+    scheme, separator, rest = base.partition("://")
+    if not separator:
+        scheme, rest = "", base
+    host, slash, path = rest.partition("/")
+
+    names = sorted({param.split("=", 1)[0] for param in query.split("&") if param})
+    return scheme.lower() + "://" + host.lower() + slash + path + "?" + "&".join(names)
+
+
+class Shapes:
+    """keep a few representative urls per shape in a single pass"""
+
+    def __init__(self, keep=1):
+        self.keep = keep  # representatives scanned per shape
+        self.counts = {}  # shape -> representatives seen
+        self.collapsed = []  # duplicates left out
+
+    def add(self, url):
+        """return True if the url represents its shape"""
+
+        key = shape(url)
+        count = self.counts.get(key, 0)
+        if count >= self.keep:
+            self.collapsed.append(url)
+            return False
+
+        self.counts[key] = count + 1
+        return True
+
+    def filter(self, urls):
+        """yield the representatives of the given urls, lazily"""
+
+        for url in urls:
+            if self.add(url):
+                yield url
+
+
+def host(url):
+    """return the lowercased host (with port) of the url"""
+
+    rest = url.partition("#")[0].partition("?")[0]
+    scheme, separator, after = rest.partition("://")
+    if separator:
+        rest = after
+    return rest.partition("/")[0].lower()
@@ -1,4 +1,7 @@
 import re
+import codecs
+
+from src import metrics
 
 # thanks Ekultek (https://github.com/Ekultek) for giving better idea of detection
 sql_errors = {
@@ -14,11 +17,136 @@ sql_errors = {
 }
 
 
+def anchor(error):
+    """return the longest literal every match of the pattern must contain"""
+
+    runs = [""]
+    depth = 0  # inside a group or character class, contents are optional
+    index = 0
+
+    while index < len(error):
+        char = error[index]
+
+        if char == "\\":
+            escaped = error[index + 1:index + 2]
+            index += 2
+            # \d, \W, \b, \A ... are not literals, \. \( ... are
+            if depth or escaped.isalnum():
+                runs.append("")
+            else:
+                runs[-1] += escaped
+            continue
+
+        index += 1
+        if char in "([":
+            depth += 1
+            runs.append("")
+        elif char in ")]":
+            depth -= 1
+            runs.append("")
+        elif char == "|" and depth == 0:
+            return ""  # alternatives at top level share no literal
+        elif char in "*?{":
+            # the quantified character is optional
+            runs[-1] = runs[-1][:-1]
+            runs.append("")
+        elif char in ".^$+":
+            runs.append("")
+        elif depth == 0:
+            runs[-1] += char
+
+    return max(runs, key=len)
+
+
+# compiled once at import: (db, pattern, anchor, wide) in priority order,
+# \W of wide patterns may match a newline so they reach into the next line
+signatures = [(db, re.compile(error), anchor(error), r"\W" in error)
+              for db, errors in sql_errors.items() for error in errors]
+
+# distinct anchors, looked up with str.find which is much cheaper than a regex pass
+anchors = sorted({sign[2] for sign in signatures if sign[2]})
+
+# patterns without an anchor have to be searched on every body
+unanchored = [index for index, sign in enumerate(signatures) if not sign[2]]
+
+
+@metrics.timed("sqliv_regex")
 def check(html):
     """check SQL error is in HTML or not"""
-    for db, errors in sql_errors.items():
-        for error in errors:
-            if re.compile(error).search(html):
-                #print "\n" + db
+    # web.gethtml returns raw bytes
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", "ignore")
+
+    # only \W matches a newline, so the candidate region of an anchor hit
+    # is its line with the newline before it, grown by a line on each side
+    # for wide patterns
+    regions = {}  # anchor -> (start, end) of lines containing it
+    for literal in anchors:
+        hit = html.find(literal)
+        while hit != -1:
+            start = max(html.rfind("\n", 0, hit), 0)
+            end = html.find("\n", hit)
+            if end == -1:
+                end = len(html)
+            regions.setdefault(literal, []).append((start, end))
+            hit = html.find(literal, end)
+
+    if not regions and not unanchored:
+        return False, None
+
+    for db, pattern, literal, wide in signatures:
+        if not literal:
+            if pattern.search(html):
                 return True, db
+            continue
+
+        for start, end in regions.get(literal, ()):
+            if wide:
+                start, end = widen(html, start, end)
+            if pattern.search(html, start, end):
+                return True, db
+
     return False, None
+
+
+def widen(html, start, end):
+    """return the region grown by the line before it and the line after it"""
+
+    after = html.find("\n", end + 1)
+    return max(html.rfind("\n", 0, start), 0), len(html) if after == -1 else after
+
+
+# characters of the previous chunks searched again with the next one, a
+# match spanning a chunk boundary and longer than this is missed
+MAXCARRY = 4096
+
+
+class Matcher:
+    """check() over a body that arrives in chunks
+
+    reading stops at the first chunk holding an SQL error, so a body with
+    errors of several DBMS is reported under the first one read, where
+    check() on the whole body reports the first in sql_errors order
+    """
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder("utf-8")("ignore")
+        self.carry = ""  # last two lines of the previous chunks, at most MAXCARRY
+        self.db = None
+
+    def feed(self, chunk):
+        """feed the next chunk of the body, return True once a SQL error is found"""
+
+        text = self.carry + self.decoder.decode(chunk)
+        vulnerable, db = check(text)
+        if vulnerable:
+            self.db = db
+            return True
+
+        # a wide pattern spans at most one newline, so only the last two
+        # lines can still complete a match with the next chunk; bodies
+        # without newlines would otherwise be searched again in full
+        last = text.rfind("\n")
+        start = text.rfind("\n", 0, max(last, 0)) + 1
+        self.carry = text[max(start, len(text) - MAXCARRY):]
+        return False
@@ -1,5 +1,8 @@
+import os
 import time
 import json
+import tempfile
+import contextlib
 from termcolor import colored, cprint
 from terminaltables import SingleTable
 
@@ -59,15 +62,57 @@ def dumpjson(array, filename='wtf.json'):
 
     for index, result in enumerate(array):
         jsondata[index] = {
-            'url': result[0].encode('utf-8'),
-            'db': result[1].encode('utf-8'),
-            'server': result[2].encode('utf-8'),
-            'lang': result[3].encode('utf-8')
+            'url': result[0],
+            'db': result[1],
+            'server': result[2],
+            'lang': result[3]
         }
 
     with open(filename, 'w') as output:
         output.write(json.dumps(jsondata, indent=4))
 
+@contextlib.contextmanager
+def atomicwrite(filename, mode="w", permissions=None):
+    """open a file written aside then renamed over filename
+
+    a concurrent reader never sees half a file, the file written aside is
+    removed if writing fails
+    """
+
+    handle, temp = tempfile.mkstemp(prefix="." + os.path.basename(filename) + ".",
+                                    dir=os.path.dirname(filename) or ".")
+    try:
+        with os.fdopen(handle, mode) as output:
+            yield output
+        if permissions is not None:
+            os.chmod(temp, permissions)
+        os.replace(temp, filename)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+
+def readjson(filename):
+    """return the data saved by writejson, None if missing or unreadable"""
+
+    try:
+        with open(filename) as saved:
+            return json.load(saved)
+    except (OSError, ValueError):
+        return None
+
+def writejson(data, filename):
+    """save data as JSON with atomicwrite, return False if it could not be written"""
+
+    try:
+        with atomicwrite(filename) as output:
+            json.dump(data, output)
+    except OSError:
+        return False
+    return True
+
 def printserverinfo(data):
     """show vulnerable websites in table"""
 
@@ -0,0 +1,67 @@
+# asyncio counterpart of web.streamhtml used by the asyncio scan engine
+
+import time
+import asyncio
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from src.web import useragents
+from src.web import web
+
+
+def session(concurrency):
+    """return a client session allowing the given number of open connections"""
+
+    if aiohttp is None:
+        raise RuntimeError("asyncio engine requires aiohttp, run: pip install aiohttp")
+
+    connector = aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=10)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def streamhtml(session, url, feed, maxbytes=web.MAXBYTES, headers=None):
+    """pass the body of the given url to feed() chunk by chunk, see web.streamhtml"""
+
+    if not (url.startswith("http://") or url.startswith("https://")):
+        url = "http://" + url
+
+    size = 0
+    started = time.perf_counter()
+
+    try:
+        async with session.get(url, headers=useragents.get()) as reply:
+            web.requested(url, reply.status, time.perf_counter() - started)
+
+            if headers is not None:
+                web.serverheaders(reply.headers, headers)
+
+            # read html content anyway for reply with HTTP500
+            if reply.status >= 400 and reply.status != 500:
+                return False
+            if not web.istext(reply.headers.get("Content-Type")):
+                return False
+
+            while size < maxbytes:
+                chunk = await reply.content.read(min(web.CHUNKSIZE, maxbytes - size))
+                if not chunk:
+                    break
+                size += len(chunk)
+                if feed(chunk):
+                    break
+
+            # unread rest of the body is discarded with the connection
+            if not reply.content.at_eof():
+                reply.close()
+
+    except asyncio.CancelledError:
+        raise
+
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, OSError) as error:
+        web.failed(url, error, isinstance(error, asyncio.TimeoutError))
+
+    web.received(url, size)
+    return size > 0
@@ -0,0 +1,104 @@
+# on-disk cache of search engine result pages
+
+import os
+import time
+import sqlite3
+import threading
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".sqliv-cache")
+DEFAULT_TTL = 24 * 3600  # seconds a result page stays valid
+DEFAULT_MAXSIZE = 64 * 1024 * 1024  # bytes of pages kept, least recently used go first
+EVICTBATCH = 16  # least recently used pages read at once when over maxsize
+
+
+class PageCache:
+    """result pages keyed on (engine, query, offset), expiring after ttl
+
+    with refresh, cached pages are ignored but fresh ones are still stored
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL, maxsize=DEFAULT_MAXSIZE, refresh=False):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.refresh = refresh
+
+        # search engines fetch pages from several threads
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "engine TEXT, query TEXT, offset INTEGER, body BLOB, stored REAL, used REAL, "
+            "PRIMARY KEY (engine, query, offset))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS pages_used ON pages (used)")
+        self.connection.commit()
+
+        # bytes of the bodies stored, summed once then kept up to date by put and get
+        self.size = self.connection.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM pages").fetchone()[0]
+
+    def get(self, engine, query, offset):
+        """return the cached page, None if missing or expired"""
+
+        if self.refresh:
+            return None
+
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT body, stored, LENGTH(body) FROM pages WHERE engine = ? AND query = ? AND offset = ?",
+                (engine, query, offset)).fetchone()
+            if row is None:
+                return None
+
+            if now - row[1] > self.ttl:
+                self.connection.execute(
+                    "DELETE FROM pages WHERE engine = ? AND query = ? AND offset = ?", (engine, query, offset))
+                self.size -= row[2]
+                return None
+
+            self.connection.execute(
+                "UPDATE pages SET used = ? WHERE engine = ? AND query = ? AND offset = ?",
+                (now, engine, query, offset))
+            return row[0]
+
+    def put(self, engine, query, offset, body):
+        """store a page, evicting the least recently used ones over maxsize"""
+
+        now = time.time()
+        with self.lock, self.connection:
+            replaced = self.connection.execute(
+                "SELECT LENGTH(body) FROM pages WHERE engine = ? AND query = ? AND offset = ?",
+                (engine, query, offset)).fetchone()
+            self.connection.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                                    (engine, query, offset, body, now, now))
+            self.size += self.connection.execute(
+                "SELECT LENGTH(body) FROM pages WHERE engine = ? AND query = ? AND offset = ?",
+                (engine, query, offset)).fetchone()[0]
+            if replaced is not None:
+                self.size -= replaced[0]
+
+            # the pages_used index hands out the oldest pages first, a few at a time
+            while self.size > self.maxsize:
+                oldest = self.connection.execute(
+                    "SELECT rowid, LENGTH(body) FROM pages ORDER BY used LIMIT ?", (EVICTBATCH,)).fetchall()
+                if not oldest:
+                    self.size = 0
+                    break
+                for rowid, length in oldest:
+                    if self.size <= self.maxsize:
+                        break
+                    self.connection.execute("DELETE FROM pages WHERE rowid = ?", (rowid,))
+                    self.size -= length
+
+    def cached(self, engine, query, offset, fetch):
+        """return the cached page, or fetch() and store it"""
+
+        body = self.get(engine, query, offset)
+        if body is None:
+            body = fetch()
+            self.put(engine, query, offset, body)
+        return body
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
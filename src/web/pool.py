@@ -0,0 +1,210 @@
+# keep-alive HTTP connections shared by every web.gethtml caller
+
+import os
+import ssl
+import time
+import base64
+import threading
+import http.client
+import urllib.request
+from urllib.parse import urlsplit, unquote
+
+
+class HTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection that resumes a previous TLS session of the same host"""
+
+    def __init__(self, host, port=None, session=None, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.session = session
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+
+        server_hostname = self._tunnel_host if self._tunnel_host else self.host
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname, session=self.session)
+
+
+class Response:
+    """response of a pooled connection, hands the connection back once read"""
+
+    def __init__(self, pool, key, connection, response):
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+        self.response = response
+        self.status = response.status
+        self.headers = response.headers
+        self.url = None
+
+    def read(self, amt=None):
+        return self.response.read(amt)
+
+    def read1(self, amt=-1):
+        """return up to amt bytes with at most one read of the socket"""
+
+        return self.response.read1(amt)
+
+    def close(self):
+        """give the connection back to the pool, or drop it if not reusable"""
+
+        if self.connection is None:
+            return
+
+        # a partly read body leaves the connection in an unknown state
+        if self.response.isclosed() and not self.response.will_close:
+            self.pool.release(self.key, self.connection)
+        else:
+            self.connection.close()
+
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """persistent connections per (scheme, host, port) with idle eviction
+
+    http_proxy, https_proxy and no_proxy are honored like urllib does,
+    https goes through a CONNECT tunnel of the proxy
+    """
+
+    def __init__(self, maxidle=4, idletimeout=30, timeout=10):
+        self.maxidle = maxidle  # idle connections kept per host
+        self.idletimeout = idletimeout  # seconds before an idle connection is closed
+        self.timeout = timeout
+        self.context = ssl.create_default_context()
+
+        self.idle = {}  # key -> [(connection, released at)]
+        self.sessions = {}  # key -> last TLS session, for resumption
+        self.lock = threading.Lock()
+        self.lastsweep = time.monotonic()
+        self.proxies = urllib.request.getproxies()
+        self.routes = {}  # key -> (proxy host, port, Proxy-Authorization) or None
+
+        # connections must not be shared with forked worker processes
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def urlopen(self, url, headers=None, method="GET", body=None):
+        """send a request over a pooled connection and return the Response"""
+
+        parsed = urlsplit(url)
+        scheme = parsed.scheme.lower()
+        port = parsed.port or (443 if scheme == "https" else 80)
+        key = (scheme, parsed.hostname, port)
+
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+
+        headers = dict(headers or {})
+        route = self.route(key)
+        if route and scheme != "https":
+            # a plain http proxy is sent the full url
+            path = "{}://{}:{}{}".format(scheme, parsed.hostname, port, path)
+            if route[2]:
+                headers["Proxy-Authorization"] = route[2]
+
+        while True:
+            connection, reused = self.acquire(key)
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                # server closed the idle connection, retry on a new one
+                if reused:
+                    continue
+                raise
+
+            return Response(self, key, connection, response)
+
+    def acquire(self, key):
+        """return (connection, reused) for the given key"""
+
+        now = time.monotonic()
+        with self.lock:
+            connections = self.idle.get(key, [])
+            while connections:
+                connection, released = connections.pop()
+                if now - released < self.idletimeout:
+                    return connection, True
+                connection.close()
+
+        scheme, host, port = key
+        route = self.route(key)
+        if route:
+            proxyhost, proxyport, authorization = route
+            if scheme == "https":
+                connection = HTTPSConnection(proxyhost, proxyport, session=self.sessions.get(key),
+                                             timeout=self.timeout, context=self.context)
+                connection.set_tunnel(host, port, {"Proxy-Authorization": authorization} if authorization else None)
+                return connection, False
+
+            return http.client.HTTPConnection(proxyhost, proxyport, timeout=self.timeout), False
+
+        if scheme == "https":
+            return HTTPSConnection(host, port, session=self.sessions.get(key),
+                                   timeout=self.timeout, context=self.context), False
+
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def route(self, key):
+        """return (proxy host, proxy port, Proxy-Authorization or None) for key, None to connect directly"""
+
+        if key in self.routes:
+            return self.routes[key]
+
+        scheme, host, port = key
+        proxy = self.proxies.get(scheme)
+        route = None
+        if proxy and not urllib.request.proxy_bypass(host):
+            parsed = urlsplit(proxy if "://" in proxy else "http://" + proxy)
+            authorization = None
+            if parsed.username:
+                credentials = "{}:{}".format(unquote(parsed.username), unquote(parsed.password or ""))
+                authorization = "Basic " + base64.b64encode(credentials.encode()).decode()
+            route = (parsed.hostname, parsed.port or 80, authorization)
+
+        self.routes[key] = route
+        return route
+
+    def release(self, key, connection):
+        """put a connection with a fully read response back to the pool"""
+
+        now = time.monotonic()
+        with self.lock:
+            session = getattr(connection.sock, "session", None)
+            if session is not None:
+                self.sessions[key] = session
+
+            connections = self.idle.setdefault(key, [])
+            connections.append((connection, now))
+            if len(connections) > self.maxidle:
+                connections.pop(0)[0].close()
+
+        if now - self.lastsweep > self.idletimeout:
+            self.sweep()
+
+    def sweep(self):
+        """close connections idle for longer than idletimeout"""
+
+        now = time.monotonic()
+        with self.lock:
+            self.lastsweep = now
+            for key in list(self.idle):
+                connections = self.idle[key]
+                while connections and now - connections[0][1] >= self.idletimeout:
+                    connections.pop(0)[0].close()
+                if not connections:
+                    del self.idle[key]
+
+    def reset(self):
+        """forget inherited connections without closing the parent's sockets"""
+
+        self.idle = {}
+        self.lock = threading.Lock()
@@ -4,6 +4,7 @@ import sys
 from urllib.error import HTTPError, URLError
 import urllib.request
 
+from src import metrics
 from lib import bing
 from lib import google
 from lib import yahoo
@@ -11,46 +12,47 @@ from lib import yahoo
 bingsearch = bing.Bing()
 yahoosearch = yahoo.Yahoo()
 
+def setcache(pagecache):
+    """make every engine read result pages through pagecache, None disables caching"""
+
+    bingsearch.cache = pagecache
+    yahoosearch.cache = pagecache
+    google.page_cache = pagecache
+
 class Search:
     """basic search class that can be inherited by other search agents like Google, Yandex"""
-    pass
 
-class Google(Search):
     def search(self, query, pages=10):
         """search and return an array of urls"""
 
-        urls = []
+        return list(self.iterate(query, pages))
+
+    def iterate(self, query, pages=10):
+        """yield urls as soon as each result page is parsed"""
+
+        engine = type(self).__name__.lower()
 
         try:
-            for url in google.search(query, start=0, stop=pages):
-                urls.append(url)
+            with metrics.timer("sqliv_phase_seconds", phase="search"):
+                for url in self.results(query, pages):
+                    metrics.count("sqliv_search_results_total", engine=engine)
+                    yield url
         except HTTPError:
             exit("[503] Service Unreachable")
         except URLError:
             exit("[504] Gateway Timeout")
-        except:
+        except Exception:
             exit("Unknown error occurred")
-        else:
-            return urls
+
+class Google(Search):
+    def results(self, query, pages=10):
+        return google.search(query, start=0, stop=pages)
 
 class Bing(Search):
-    def search(self, query, pages=10):
-        try:
-            return bingsearch.search(query, stop=pages)
-        except HTTPError:
-            exit("[503] Service Unreachable")
-        except URLError:
-            exit("[504] Gateway Timeout")
-        except:
-            exit("Unknown error occurred")
+    def results(self, query, pages=10):
+        return bingsearch.results(query, stop=pages)
 
 class Yahoo(Search):
-    def search(self, query, pages=1):
-        try:
-            return yahoosearch.search(query, pages)
-        except HTTPError:
-            exit("[503] Service Unreachable")
-        except URLError:
-            exit("[504] Gateway Timeout")
-        except:
-            exit("Unknown error occurred")
+    def results(self, query, pages=10):
+        # pages is the number of websites wanted, ten per result page
+        return yahoosearch.results(query, per_page=10, pages=max(1, (int(pages) + 9) // 10))
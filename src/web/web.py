@@ -1,8 +1,49 @@
-#import sys
-import urllib.request
-from urllib.parse import urlparse
+import sys
+import time
+import socket
+from urllib.parse import urljoin
 
-import useragents
+from src import shape
+from src import metrics
+from src.web import useragents
+from src.web.pool import ConnectionPool
+
+# shared by scanner, serverinfo and crawler in each process
+pool = ConnectionPool()
+
+REDIRECTS = (301, 302, 303, 307, 308)
+
+MAXBYTES = 1024 * 1024  # stop streaming a body after this many bytes
+CHUNKSIZE = 16 * 1024
+TEXTTYPES = ("text/", "xml", "json", "javascript")
+# response headers naming the server software, kept for the server info table
+SERVERHEADERS = ("Server", "X-Powered-By")
+TIMEOUTS = (socket.timeout, TimeoutError)
+
+
+def urlopen(url, header, maxredirects=10, method="GET"):
+    """return a pooled Response of the given url, following redirects"""
+
+    for _ in range(maxredirects + 1):
+        started = time.perf_counter()
+        try:
+            reply = pool.urlopen(url, header, method)
+        except Exception as error:
+            failed(url, error)
+            raise
+        requested(url, reply.status, time.perf_counter() - started)
+
+        location = reply.headers.get("Location")
+
+        if reply.status not in REDIRECTS or not location:
+            reply.url = url
+            return reply
+
+        reply.read()
+        reply.close()
+        url = urljoin(url, location)
+
+    raise IOError("too many redirects")
 
 
 def gethtml(url, lastURL=False):
@@ -12,22 +53,10 @@ def gethtml(url, lastURL=False):
         url = "http://" + url
 
     header = useragents.get()
-    request = urllib.request.Request(url, None, header)
     html = None
 
     try:
-        reply = urllib.request.urlopen(request, timeout=10)
-
-    except urllib.error.HTTPError as e:
-        # read html content anyway for reply with HTTP500
-        if e.getcode() == 500:
-            html = e.read()
-        #print >> sys.stderr, "[{}] HTTP error".format(e.code)
-        pass
-
-    except urllib.error.URLError as e:
-        #print >> sys.stderr, "URL error, {}".format(e.reason)
-        pass
+        reply = urlopen(url, header)
 
     except KeyboardInterrupt:
         raise KeyboardInterrupt
@@ -37,7 +66,14 @@ def gethtml(url, lastURL=False):
         pass
 
     else:
+        # body is read even on errors so the connection can be reused
         html = reply.read()
+        reply.close()
+        received(url, len(html))
+
+        # read html content anyway for reply with HTTP500
+        if reply.status >= 400 and reply.status != 500:
+            html = None
 
     if html:
         if lastURL == True:
@@ -46,3 +82,127 @@ def gethtml(url, lastURL=False):
             return html
 
     return False
+
+
+def lasturl(url):
+    """return the url the given url redirects to, or False if it fails
+
+    only HEAD requests are sent, no body is downloaded
+    """
+
+    if not (url.startswith("http://") or url.startswith("https://")):
+        url = "http://" + url
+
+    try:
+        reply = urlopen(url, useragents.get(), method="HEAD")
+
+    except KeyboardInterrupt:
+        raise KeyboardInterrupt
+
+    except:
+        return False
+
+    # a HEAD reply has no body, reading it hands the connection back
+    reply.read()
+    reply.close()
+    return reply.url
+
+
+def requested(url, status, seconds):
+    """count a request answered with status after seconds"""
+
+    if metrics.enabled:
+        host = shape.host(url)
+        metrics.count("sqliv_requests_total", host=host, status=metrics.status(status))
+        metrics.observe("sqliv_request_seconds", seconds, host=host)
+
+
+def received(url, size):
+    """count the bytes of a body read"""
+
+    if metrics.enabled:
+        metrics.count("sqliv_response_bytes_total", size, host=shape.host(url))
+
+
+def failed(url, error, timeout=False):
+    """count a request which failed with error"""
+
+    if metrics.enabled:
+        timeout = timeout or isinstance(error, TIMEOUTS)
+        metrics.count("sqliv_timeouts_total" if timeout else "sqliv_request_errors_total", host=shape.host(url))
+
+
+def istext(contenttype):
+    """tell if the Content-Type can carry an SQL error message"""
+
+    # servers that send no Content-Type are given the benefit of the doubt
+    if not contenttype:
+        return True
+
+    contenttype = contenttype.lower()
+    return any(texttype in contenttype for texttype in TEXTTYPES)
+
+
+def serverheaders(replyheaders, headers):
+    """add SERVERHEADERS of a reply to headers, keeping values already there"""
+
+    for name in SERVERHEADERS:
+        value = replyheaders.get(name)
+        if value and name not in headers:
+            headers[name] = value
+
+
+def streamhtml(url, feed, maxbytes=MAXBYTES, headers=None):
+    """pass the body of the given url to feed() chunk by chunk
+
+    reading stops as soon as feed returns True or maxbytes are read,
+    bodies which are not text are skipped; returns False if nothing was read.
+    SERVERHEADERS of the reply are added to the headers dict if given
+    """
+
+    if not (url.startswith("http://") or url.startswith("https://")):
+        url = "http://" + url
+
+    header = useragents.get()
+    size = 0
+
+    try:
+        reply = urlopen(url, header)
+
+    except KeyboardInterrupt:
+        raise KeyboardInterrupt
+
+    except:
+        return False
+
+    try:
+        if headers is not None:
+            serverheaders(reply.headers, headers)
+
+        # read html content anyway for reply with HTTP500
+        if reply.status >= 400 and reply.status != 500:
+            return False
+        if not istext(reply.headers.get("Content-Type")):
+            return False
+
+        while size < maxbytes:
+            # read1 returns what has arrived, read would wait for a full chunk
+            chunk = reply.read1(min(CHUNKSIZE, maxbytes - size))
+            if not chunk:
+                break
+            size += len(chunk)
+            if feed(chunk):
+                break
+
+    except KeyboardInterrupt:
+        raise KeyboardInterrupt
+
+    except:
+        failed(url, sys.exc_info()[1])
+
+    finally:
+        # drops the connection if the body was not read to the end
+        reply.close()
+        received(url, size)
+
+    return size > 0